@@ -1,451 +1,2318 @@
-###############################################################################
-# This program is meant to be incorporated into certain tests within QATrack 
-# (http://qatrackplus.com/)
-# There are two main modes to the program:
-#   1) The ability to compare a static normalized profiler data 
-#      set to a reference
-#   2) The ability to analyze a profiler 'movie' frame by frame 
-#      (an arc for us, but can be generalized to any movie)
-# 
-# The reference files should be located in the following directory:
-# H:\DSP\Radio-oncologie\commun\Physique radio-onco\QAtrack\References\Profiler
-#
-# For information on how to implement within QATrack, see the file 
-# QATrack_implementation.docx
-#
-# Ellis Mitrou (ellis.mitrou.chum@ssss.gouv.qc.ca)
-# c2017
-###############################################################################
-import sys,os.path
-import re
-import numpy
-from scipy import interpolate
-
-# gets the number of frames in a given profiler file.   
-def getNumFrames(filename):
-    with open(filename,"r") as f:
-        arc_data = f.read().splitlines()
-    
-    for j in range(0,len(arc_data)-1):
-        if 'Frames:' in arc_data[j]:
-            frameline = j
-            numframes = len(arc_data) - frameline - 2
-    return numframes
-            
-
-######Arc analysis functions#####
-
-#extracts a particular frame's AB and GT data and returns two lists. 
-# frameNum starts at 1.
-def extractArcFrame(filename,frameNum):
-    with open(filename,"r") as f:
-        arc_data = f.read().splitlines()    
-    AB_Frame = []
-    GT_Frame = []
-    for j in range(0,len(arc_data)-1):
-        if 'Frames:' in arc_data[j]:
-            for k in range(j+1+int(frameNum),j+2+int(frameNum)):
-                for col in range(3,66):
-                    AB_Frame.append(float(arc_data[k].split()[col].
-                                    replace(',','.'))) #get the AB columns
-                for col in range(66,131):
-                    GT_Frame.append(
-                    float(arc_data[k].split()[col].replace(',','.')))
-            return AB_Frame, GT_Frame
-            
-#This functions analyzes
-def analyzeArc(filename,referencefilename, particletype):
-    [AB_refDist, AB_refData, GT_refDist, GT_refData, ABflatness_ref,
-     ABsymmetry_ref, GTflatness_ref,
-     GTsymmetry_ref] = load_profilerFile(referencefilename) 
-    
-    #find the number of frames to analyze
-    numFrames = getNumFrames(filename)
-    
-    #initialize some stuff:
-    overallAB_avg_maximum = 0 #Highest AB error
-    overallGT_avg_maximum = 0 #Higherst GT error
-    count = 0.00001
-    avgABsum = 0
-    avgGTsum = 0
-    #The frame that has the max avg error in GT (to be converted to an angle):
-    frameGTavg_max = 0    
-    #The frame that has the max avg error in AB (to be converted to an angle):
-    frameABavg_max = 0    
-    
-    if particletype.upper() == 'PHOTON':
-        startAngle = -180 #bipolar (photon arc)
-        stopAngle = 180 #bipolar (photon arc)        
-        
-    elif particletype.upper() == 'ELECTRON':
-        startAngle = -120 #bipolar (electron arc)
-        stopAngle = 120 #bipolar (electron arc)
-        
-    else:
-        print ('particletype has not been correctly defined. Correct '
-        'options are (PHOTON) or (ELECTRON)')
-        quit()
-    
-    # Threshold to account for profiler noise and dropped counts (%)
-    # If the error for a frame is greather than 'threshold' the following
-    # 'numFrames2skip' frames will be skipped
-    threshold = 3
-    numFrames2skip = 5
-    numSkippedFrames = 0
-    startFrame = 20
-    
-    frameNum = range(startFrame,numFrames+1) #skip the first 20 frames
-    frameNum_iter = iter(frameNum)
-    
-    for frame in frameNum_iter:
-        [AB_Frame, GT_Frame] = extractArcFrame(filename,frame)
-        [averageABError, averageGTError, ABmax, GTmax] = computeError(
-        AB_Frame, GT_Frame, AB_refData,GT_refData,particletype )
-
-        if (averageABError > threshold) | (averageGTError > threshold):
-            numSkippedFrames += 1
-            for i in range(0,numFrames2skip):
-                
-                next(frameNum_iter,None) #skipping happens in this for loop
-                    
-        else:
-            avgABsum += averageABError
-            avgGTsum += averageGTError
-        
-            if averageABError > overallAB_avg_maximum:
-                overallAB_avg_maximum = averageABError
-                frameABavg_max = frame
-            
-            if averageGTError > overallGT_avg_maximum:
-                overallGT_avg_maximum = averageGTError
-                frameGTavg_max = frame
-
-        
-        
-            count +=1
-
-
-    overallAvgAB = avgABsum/count
-    overallAvgGT = avgGTsum/count
-    #Convert frame numbers where we find the maximum 
-    #average difference to a bipolar angle:
-    angleABavg_max = (
-    (stopAngle-startAngle)*frameABavg_max/numFrames) - stopAngle
-    angleGTavg_max = (
-    (stopAngle-startAngle)*frameGTavg_max/numFrames) - stopAngle
-
-    analyzeArc_return = [overallAvgAB, overallAvgGT, overallAB_avg_maximum,
-    angleABavg_max, overallGT_avg_maximum, angleGTavg_max, numSkippedFrames]
-    return analyzeArc_return
-
-#### Static and general analysis functions ####     
-# Load a profiler file and split it in AB and GT. 
-# returns AB coordinates, AB data, GT coordinates, GT data,
-# AB flatness value, AB symmetry value. GT flatness value
-# and GT symmetry value
-
-def load_profilerFile(filename):
-    with open(filename,"r") as f:
-        profiler_data = f.read().splitlines()
-        
-    #declare data variables
-    ABdist = []
-    ABdata = []
-    GTdist = []
-    GTdata = []
-    
-    for j in range(0,len(profiler_data)-1):
-      #  print profiler_data[j]
-        
-    #find AB flatness
-        if 'XAxisAnalysis' in re.sub('[\s+]', '', profiler_data[j]):
-            ABflatness = float(
-            (profiler_data[j+7].split('perc')[1]).replace(',', '.'))
-            ABsymmetry = float(
-            (profiler_data[j+8].split('perc')[1]).replace(',', '.'))
-
-    #find AB data
-        if 'DetectorIDXAxis' in re.sub('[\s+]', '', profiler_data[j]):
-            for k in range(1,64):
-                ABdist.append(float(
-                profiler_data[j+k].split()[0].replace(',', '.')))
-                ABdata.append(float(
-                profiler_data[j+k].split()[1].replace(',', '.')))
-            
-    #find GT data
-    
-        if 'YAxisAnalysis' in re.sub('[\s+]', '', profiler_data[j]):
-            GTflatness = float(
-            (profiler_data[j+7].split('perc')[1].replace(',', '.')))
-            GTsymmetry = float(
-            (profiler_data[j+8].split('perc')[1].replace(',', '.')))
-    
-    for j in range(0,len(profiler_data)-1):
-        if 'DetectorIDYAxis' in re.sub('[\s+]', '', profiler_data[j]):
-            for k in range(1,66):
-                GTdist.append(float(
-                (profiler_data[j+k].split()[0]).replace(',', '.')))
-                GTdata.append(float(
-                (profiler_data[j+k].split()[1]).replace(',', '.')))
-    
-    
-    
-    #perform caxcorrection:
-    ABdataCAXCORRECTED = caxcorrect(ABdist,ABdata)
-    GTdataCAXCORRECTED = caxcorrect(GTdist,GTdata)
-    
-    
-    load_profilerFile_return = [ABdist, ABdataCAXCORRECTED, GTdist,
-    GTdataCAXCORRECTED, ABflatness, ABsymmetry, GTflatness, GTsymmetry]
-    return  load_profilerFile_return
-
-
-#Perform a CAX correction on the data
-#Returns the y axis (ie. AB or GT data) only
-def caxcorrect(x0, y0):
-
-    x0_A=x0[:int(len(x0)/2)]
-    x0_B=x0[int(len(x0)/2):]
-    y0_A=y0[:int(len(y0)/2)]
-    y0_B=y0[int(len(y0)/2):]
-    
-    #generate interp1d functions to find 25%
-    f_A=interpolate.interp1d(y0_A,x0_A)
-    f_B=interpolate.interp1d(y0_B,x0_B)
-
-
-
-    #Shift the data by half of the difference of the 25% positions on each side
-    xNEW = x0 - (f_A(25) + f_B(25))/2.0
-
-    #generate interp1d function to interpolate back into the original
-    #profiler coordinate system
-
-    f_caxcorrected = interpolate.interp1d(xNEW,y0,fill_value="extrapolate")
-    y_caxcorrected = f_caxcorrected(x0)
-    
-    return y_caxcorrected
-
-#Computes average and maximum errors within +-10 cm of 
-#central axis in AB and GT directions
-def computeError(ABdata,GTdata, AB_refData, GT_refData,particletype):
-    ABpoints = 0
-    GTpoints = 0
-    
-    ABdiffsum = 0
-    GTdiffsum = 0
-    
-    ABmax = 0
-    GTmax = 0
-    
-    
-    
-    if particletype.upper() == 'PHOTON':
-        ABstart = 12
-        ABstop = 51
-        GTstart = 12
-        GTstop = 53
-        
-        
-    elif particletype.upper() == 'ELECTRON':
-        ABstart = 16
-        ABstop = 46
-        GTstart = 16
-        GTstop = 48
-        
-    else:
-        print ('particletype has not been correctly defined. Correct '
-        'options are (PHOTON) or (ELECTRON)')
-        quit()
-
-    
-    for datapos in range(int(ABstart),int(ABstop)):
-        ABdifference = 100*abs(float(
-        ABdata[datapos]) - float(
-        AB_refData[datapos]))/float(AB_refData[datapos])
-        ABdiffsum += ABdifference
-        
-        
-        if ABdifference > ABmax:
-            ABmax = ABdifference
-        ABpoints+=1
-        
-    
-    for datapos in range(int(GTstart),int(GTstop)):
-        GTdifference = 100*abs(float(GTdata[datapos]) - float(
-        GT_refData[datapos]))/float(GT_refData[datapos])
-        GTdiffsum += GTdifference
-        
-        if GTdifference > GTmax:
-            GTmax = GTdifference
-        
-        GTpoints+=1
-        
-    averageABError = ABdiffsum/ABpoints
-    averageGTError = GTdiffsum/GTpoints
-    return averageABError, averageGTError, ABmax, GTmax
-
-
-def analyzeStatic(fname, ref_file,particletype):
-    #Load the reference file and file to be analyzed 
-    [AB_refDist, AB_refData, GT_refDist, GT_refData,
-        ABflatness_ref, ABsymmetry_ref, GTflatness_ref,
-            GTsymmetry_ref] = load_profilerFile(ref_file)
-    
-    [ABdist, ABdata, GTdist, GTdata, ABflatness,
-        ABsymmetry, GTflatness, GTsymmetry] = load_profilerFile(fname)
-    
-    
-    
-    #Calculate AB and GT Error for central 20 cm of the field.
-    
-    [averageABError, averageGTError, ABmax, GTmax] = computeError(
-                              ABdata,GTdata, AB_refData,GT_refData
-                              ,particletype)
-    
-    static_return = [ABsymmetry, ABflatness, GTsymmetry,
-    GTflatness, ABmax, GTmax, averageABError, averageGTError]
-    
-    return static_return
-    
-
-#Create a python dictionary with the results from the analysis
-#function to populate qatrack results.
-profiler_results = dict()
-
-#### QATrack integration begins here ####
-    
-#To test QA track implementation use this in the file upload
-# composite test calculation box. Just uncomment the necessary lines
-
-
-#For static
-# profiler_results['symAB'] = float(100)
-# profiler_results['homAB'] = float(101)
-# profiler_results['symGT'] = float(102)
-# profiler_results['homGT'] = float(103)
-# profiler_results['maxAB'] = float(104)
-# profiler_results['maxGT'] = float(105)
-# profiler_results['meanAB'] = float(106)
-# profiler_results['meanGT'] = float(107)
-# result = profiler_results
-
-#For Arc
-# profiler_results['overallAvgAB'] =1
-# profiler_results['overallAvgGT'] =2
-# profiler_results['overallABmaximum'] =3
-# profiler_results['overallGTmaximum'] =4
-# profiler_results['averageABError_neg180']=5
-# profiler_results['averageGTError_neg180']=6
-# profiler_results['ABmax_neg180']=7
-# profiler_results['GTmax_neg180']=8
-# profiler_results['averageABError_neg90']=9
-# profiler_results['averageGTError_neg90']=10
-# profiler_results['ABmax_neg90']=11
-# profiler_results['GTmax_neg90']=12
-# profiler_results['averageABError_0']=13
-# profiler_results['averageGTError_0']=14
-# profiler_results['ABmax_0']=15
-# profiler_results['GTmax_0']=16
-# profiler_results['averageABError_90']=17
-# profiler_results['averageGTError_90']=18
-# profiler_results['ABmax_90']=19
-# profiler_results['GTmax_90']=20
-# profiler_results['averageABError_180']=21
-# profiler_results['averageGTError_180']=22
-# profiler_results['ABmax_180']=23
-# profiler_results['GTmax_180']=24
-
-#From Danis Blais' catphan analysis program
-mode_command = False
-if 'FILE' in vars() or 'FILE' in globals():
-    # on recupere le nom du fichier a partir de l'objet FILE 
-    # qui nous est passe et on ferme le fichier pour ne pas avoir de conflit
-    filename = FILE.name
-    FILE.close()
-else:
-    # le programme a ete lance en dehors de QATrack+
-    if len(sys.argv) < 2:
-        print 'SVP specifiez en argument le nom du fichier'
-        quit()
-    else:
-        filename = str(sys.argv[1])
-        if not os.path.isfile(filename):
-            print "Le fichier, %(filenameerror)s specifie n'existe pas" %{
-            "filenameerror":filename}
-            quit()
-        mode_command = True
-
-
-        
-#The various tests must have this in their composite test
-# calculation procedure so that the results populate.
-#eg for 6 MV:
-    #result = profiler_stat_6mv['symAB']
-    #result = profiler_stat_6mv['meanAB']
-    #result = profiler_stat_6mv['meanGT']
-    #result = profiler_stat_6mv['maxAB']
-    #result = profiler_stat_6mv['symGT']
-    #result = profiler_stat_6mv['homAB']
-    #result = profiler_stat_6mv['homGT']
-    #result = profiler_stat_6mv['maxGT']        
-
-
-
-#Define reference file
-
-ref_path = ('/chum/dsp/Radio-oncologie/commun/Physique radio-onco/'
-            'QAtrack/References/Profiler/')
-
-
-#ref_file = ref_path + 'VERSA_ref6MV.txt'
-#ref_file = ref_path + 'VERSA_ref10MV.txt'
-#ref_file = ref_path + 'VERSA_ref18MV.txt'
-#ref_file = ref_path + 'VERSA_ref6FFF.txt'
-#ref_file = ref_path + 'VERSA_ref10FFF.txt'
-#ref_file = ref_path + 'VERSA_ref6MEV.txt'
-#ref_file = ref_path + 'VERSA_ref9MEV.txt'
-#ref_file = ref_path + 'VERSA_ref12MEV.txt'
-#ref_file = ref_path + 'VERSA_ref15MEV.txt'
-
-#ref_file = ref_path + 'EDGE_ref6MV.txt'
-#ref_file = ref_path + 'EDGE_ref6FFF.txt'
-#ref_file = ref_path + 'EDGE_ref10FFF.txt'
-#ref_file = ref_path + 'EDGE_ref25FFF.txt'
-
-#ref_file = ref_path + 'SALLEG_VARIAN_ref6MV.txt'
-
-
-#uncomment the analysis that you wish to perform:
-
-#For static analysis of photon beams:
-#[profiler_results['symAB'], profiler_results['homAB'],
-# profiler_results['symGT'], profiler_results['homGT'],
-# profiler_results['maxAB'], profiler_results['maxGT'],
-# profiler_results['meanAB'], profiler_results['meanGT']
-# ] = analyzeStatic(filename, ref_file, 'PHOTON')
- 
-#For static analysis of electron beams:
-#[profiler_results['symAB'], profiler_results['homAB'],
-# profiler_results['symGT'], profiler_results['homGT'],
-# profiler_results['maxAB'], profiler_results['maxGT'],
-# profiler_results['meanAB'], profiler_results['meanGT']
-# ] = analyzeStatic(filename, ref_file, 'ELECTRON') 
-
-#For arc analysis of photon beams:
-#[profiler_results['overallAvgAB'], profiler_results['overallAvgGT'],
-# profiler_results['overallAB_avg_maximum'], profiler_results['angleABavg_max'],
-# profiler_results['overallGT_avg_maximum'], profiler_results['angleGTavg_max'],
-# profiler_results['numSkippedFrames']
-#] = analyzeArc(filename, ref_file, 'PHOTON')
-
-#For arc analysis of electron beams:
-#[profiler_results['overallAvgAB'], profiler_results['overallAvgGT'],
-# profiler_results['overallAB_avg_maximum'], profiler_results['angleABavg_max'],
-# profiler_results['overallGT_avg_maximum'], profiler_results['angleGTavg_max'],
-# profiler_results['numSkippedFrames']
-#] = analyzeArc(filename, ref_file, 'ELECTRON')
-
-#qatrack needs this line.
-result = profiler_results 
-print result
+###############################################################################
+# This program is meant to be incorporated into certain tests within QATrack 
+# (http://qatrackplus.com/)
+# There are two main modes to the program:
+#   1) The ability to compare a static normalized profiler data 
+#      set to a reference
+#   2) The ability to analyze a profiler 'movie' frame by frame 
+#      (an arc for us, but can be generalized to any movie)
+# 
+# The reference files should be located in the following directory:
+# H:\DSP\Radio-oncologie\commun\Physique radio-onco\QAtrack\References\Profiler
+#
+# For information on how to implement within QATrack, see the file 
+# QATrack_implementation.docx
+#
+# Ellis Mitrou (ellis.mitrou.chum@ssss.gouv.qc.ca)
+# c2017
+###############################################################################
+import sys,os.path
+import mmap
+import collections
+import glob
+import fnmatch
+import json
+import csv
+import argparse
+import concurrent.futures
+import contextvars
+import time
+import functools
+import hashlib
+import inspect
+import threading
+import numpy
+
+#### Beam configurations ####
+#Settings of an analysis: detector index windows (start, stop) used to
+#compute the errors, bipolar arc angle range, frame skipping and whether
+#the profiles are CAX corrected. The index slices of the windows are
+#built once here and reused by every analysis.
+class BeamConfig(object):
+    def __init__(self, name, ABwindow, GTwindow, startAngle, stopAngle,
+                 threshold=3, numFrames2skip=5, startFrame=20,
+                 caxCorrect=True, angleBins=(-180, -90, 0, 90, 180),
+                 gammaDose=3.0, gammaDistance=0.3):
+        self.name = name
+        self.ABwindow = tuple(ABwindow)
+        self.GTwindow = tuple(GTwindow)
+        self.ABslice = slice(*self.ABwindow)
+        self.GTslice = slice(*self.GTwindow)
+        self.startAngle = startAngle
+        self.stopAngle = stopAngle
+        # Threshold to account for profiler noise and dropped counts (%)
+        # If the error for a frame is greather than 'threshold' the
+        # following 'numFrames2skip' frames will be skipped
+        self.threshold = threshold
+        self.numFrames2skip = numFrames2skip
+        #frames before startFrame are not analyzed, frames start at 1
+        self.startFrame = startFrame
+        self.caxCorrect = caxCorrect
+        #gantry angles at the centre of the bins of the per angle results,
+        #each frame goes to the bin of the nearest angle
+        self.angleBins = tuple(angleBins)
+        self.angleBinEdges = (numpy.array(self.angleBins[1:], dtype=float) +
+                              numpy.array(self.angleBins[:-1]))/2.0
+        #gamma index criteria: dose difference in % of the reference
+        #maximum and distance to agreement in cm
+        self.gammaDose = gammaDose
+        self.gammaDistance = gammaDistance
+    
+    def __repr__(self):
+        return ('BeamConfig(%r, %r, %r, %r, %r, threshold=%r, '
+                'numFrames2skip=%r, startFrame=%r, caxCorrect=%r, '
+                'angleBins=%r, gammaDose=%r, gammaDistance=%r)' % (
+                self.name, self.ABwindow, self.GTwindow, self.startAngle,
+                self.stopAngle, self.threshold, self.numFrames2skip,
+                self.startFrame, self.caxCorrect, self.angleBins,
+                self.gammaDose, self.gammaDistance))
+    
+    #returns a copy of this configuration with some settings changed
+    def replace(self, **changes):
+        settings = dict(name=self.name, ABwindow=self.ABwindow,
+                        GTwindow=self.GTwindow, startAngle=self.startAngle,
+                        stopAngle=self.stopAngle, threshold=self.threshold,
+                        numFrames2skip=self.numFrames2skip,
+                        startFrame=self.startFrame,
+                        caxCorrect=self.caxCorrect, angleBins=self.angleBins,
+                        gammaDose=self.gammaDose,
+                        gammaDistance=self.gammaDistance)
+        settings.update(changes)
+        return BeamConfig(**settings)
+
+#+-10 cm of central axis, bipolar photon arc
+PHOTON = BeamConfig('PHOTON', (12, 51), (12, 53), -180, 180)
+#bipolar electron arc
+ELECTRON = BeamConfig('ELECTRON', (16, 46), (16, 48), -120, 120)
+#settings of the former profilerAnalysis_photons.py script
+PHOTON_LEGACY = PHOTON.replace(name='PHOTON_LEGACY', caxCorrect=False)
+#settings of the former profilerAnalysis_electrons.py script, which
+#analyzed every frame
+ELECTRON_LEGACY = ELECTRON.replace(name='ELECTRON_LEGACY', caxCorrect=False,
+                                   threshold=float('inf'), numFrames2skip=0,
+                                   startFrame=1)
+
+BEAM_CONFIGS = dict((config.name, config) for config in
+                    [PHOTON, ELECTRON, PHOTON_LEGACY, ELECTRON_LEGACY])
+
+#Returns the BeamConfig for a particle type name ('PHOTON', 'ELECTRON',
+#...) or the config itself if one is given
+def getBeamConfig(particletype):
+    if isinstance(particletype, BeamConfig):
+        return particletype
+    try:
+        return BEAM_CONFIGS[particletype.upper()]
+    except KeyError:
+        raise ValueError('particletype has not been correctly defined. '
+                         'Correct options are %s' % 
+                         ', '.join(sorted(BEAM_CONFIGS)))
+
+#### Instrumentation ####
+#Inside a 'with instrumentation() as recorder:' block, every call to the
+#instrumented stages below adds its wall time (including the stages it
+#calls), and the bytes read and frames processed by the readers and
+#error computation, to recorder.stages. When no recorder is active the
+#stages only pay for one check per call.
+#The active recorders are a context variable, so that the analyses run
+#at the same time by other threads (eg. the requests of profilerDaemon)
+#or asyncio tasks are not recorded by this thread's recorders.
+_recorders = contextvars.ContextVar('profilerAnalysis.recorders',
+                                    default=())
+
+class StageRecorder(object):
+    #callback, if given, is called as callback(stage, seconds, bytesRead,
+    #frames) for every recorded event
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stages = collections.OrderedDict()
+        #worker threads of an analysis may record at the same time
+        self._lock = threading.Lock()
+        self._tokens = []
+    
+    def __enter__(self):
+        self._tokens.append(_recorders.set(_recorders.get() + (self,)))
+        return self
+    
+    def __exit__(self, *exc_info):
+        _recorders.reset(self._tokens.pop())
+    
+    def record(self, stage, seconds=0.0, calls=0, bytesRead=0, frames=0):
+        with self._lock:
+            totals = self.stages.get(stage)
+            if totals is None:
+                totals = self.stages[stage] = dict(seconds=0.0, calls=0,
+                                                   bytesRead=0, frames=0)
+            totals['seconds'] += seconds
+            totals['calls'] += calls
+            totals['bytesRead'] += bytesRead
+            totals['frames'] += frames
+        if self.callback is not None:
+            self.callback(stage, seconds, bytesRead, frames)
+    
+    #per stage totals, as plain dictionaries
+    def summary(self):
+        return dict((stage, dict(totals)) 
+                    for [stage, totals] in self.stages.items())
+
+#Context manager recording the stage timings, see StageRecorder
+def instrumentation(callback=None):
+    return StageRecorder(callback)
+
+def _record(stage, seconds=0.0, calls=0, bytesRead=0, frames=0):
+    for recorder in _recorders.get():
+        recorder.record(stage, seconds, calls, bytesRead, frames)
+
+#decorator timing the calls of a stage while a recorder is active
+def _instrumented(stage):
+    def decorate(function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            if not _recorders.get():
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(stage, time.perf_counter() - start, calls=1)
+        return timed
+    return decorate
+
+#Wraps function to run in the context of the calling thread, so that
+#the threads of a pool record to the recorders of their caller
+def _inCallerContext(function):
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(function, *args)
+
+#### Result memoization ####
+# QATrack re-runs the analysis of an upload every time its test list is
+# reviewed. When RESULT_CACHE_DIR is set, the results of the memoized
+# analyses are stored there under a key made of the content hashes of the
+# measurement and reference and of every analysis setting, and reused
+# while they are among the RESULT_CACHE_SIZE most recently used entries.
+# Analyses of ProfilerMeasurement and ArcMovie objects are only memoized
+# if they were parsed from a file buffer (parseProfilerBuffer), which
+# gives them the hash of the file content.
+# Entries are .npz files holding the results as JSON and their arrays,
+# read without unpickling, so a cache directory on a shared drive cannot
+# be used to run code in the analyses.
+RESULT_CACHE_DIR = None
+RESULT_CACHE_SIZE = 1000
+#changes whenever the results of an unchanged file could change
+RESULT_CACHE_VERSION = 2
+#analyses called by a memoized analysis are not memoized themselves
+_memoizing = threading.local()
+
+#decorator memoizing an analysis function(filename, ref_file,
+#particletype, ...)
+def _memoized(function):
+    signature = inspect.signature(function)
+    @functools.wraps(function)
+    def memoized(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        cacheDir = RESULT_CACHE_DIR
+        if cacheDir is None or getattr(_memoizing, 'active', False):
+            return function(*args, **kwargs)
+        key = _resultKey(function.__name__, arguments.arguments)
+        if key is None:
+            return function(*args, **kwargs)
+        
+        cacheFile = os.path.join(cacheDir, '%s.npz' % key)
+        [found, result] = _readResultCache(cacheFile)
+        if found:
+            return result
+        _memoizing.active = True
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            _memoizing.active = False
+        _writeResultCache(cacheFile, result)
+        return result
+    return memoized
+
+#Hash of the analysis, its files' content and its settings, None if the
+#content of the files is not known
+def _resultKey(name, arguments):
+    arguments = list(arguments.items())
+    hashes = [_sourceHash(source) for [argument, source] in arguments[0:2]]
+    if None in hashes:
+        return None
+    settings = ([RESULT_CACHE_VERSION, name] + hashes +
+                [getBeamConfig(arguments[2][1])] + arguments[3:])
+    return hashlib.blake2b(repr(settings).encode('utf-8'),
+                           digest_size=20).hexdigest()
+
+def _sourceHash(source):
+    if isinstance(source, (ProfilerMeasurement, ArcMovie)):
+        return source.contentHash
+    return contentHash(source)
+
+#Results as JSON values: arrays are stored apart in 'arrays' and
+#replaced by their name, tuples and dictionaries are tagged so that they
+#are decoded as such. Raises TypeError for other objects.
+def _encodeResult(result, arrays):
+    if isinstance(result, numpy.ndarray):
+        if result.dtype.hasobject:
+            raise TypeError('Cannot store arrays of objects')
+        name = 'array%d' % len(arrays)
+        arrays[name] = result
+        return {'array': name}
+    if isinstance(result, numpy.generic):
+        return result.item()
+    if isinstance(result, tuple):
+        return {'tuple': [_encodeResult(value, arrays) for value in result]}
+    if isinstance(result, list):
+        return [_encodeResult(value, arrays) for value in result]
+    if isinstance(result, dict):
+        return {'dict': [[_encodeResult(key, arrays),
+                          _encodeResult(value, arrays)] 
+                         for [key, value] in result.items()]}
+    if result is None or isinstance(result, (bool, int, float, str)):
+        return result
+    raise TypeError('Cannot store %s results' % type(result).__name__)
+
+def _decodeResult(encoded, arrays):
+    if isinstance(encoded, list):
+        return [_decodeResult(value, arrays) for value in encoded]
+    if isinstance(encoded, dict):
+        if 'array' in encoded:
+            return arrays[encoded['array']]
+        if 'tuple' in encoded:
+            return tuple(_decodeResult(value, arrays) 
+                         for value in encoded['tuple'])
+        return dict((_decodeResult(key, arrays), _decodeResult(value, arrays))
+                    for [key, value] in encoded['dict'])
+    return encoded
+
+#returns (True, result), or (False, None) if the entry is missing
+def _readResultCache(cacheFile):
+    try:
+        with numpy.load(cacheFile, allow_pickle=False) as cached:
+            arrays = dict((name, cached[name]) for name in cached.files)
+        result = _decodeResult(json.loads(str(arrays.pop('result'))), arrays)
+        os.utime(cacheFile) #most recently used
+    except (IOError, OSError, KeyError, ValueError):
+        return False, None
+    if _recorders.get():
+        _record('resultCache', calls=1, bytesRead=os.path.getsize(cacheFile))
+    return True, result
+
+#writes an entry and evicts the least recently used entries, failing to
+#write is not fatal
+def _writeResultCache(cacheFile, result):
+    cacheDir = os.path.dirname(cacheFile)
+    tmpFile = '%s.%d.%d.tmp' % (cacheFile, os.getpid(), threading.get_ident())
+    try:
+        arrays = dict()
+        encoded = json.dumps(_encodeResult(result, arrays))
+        #the workers of a batch may create it at the same time
+        os.makedirs(cacheDir, exist_ok=True)
+        with open(tmpFile, 'wb') as f:
+            numpy.savez(f, result=numpy.array(encoded), **arrays)
+        os.replace(tmpFile, cacheFile)
+        
+        entries = [entry for entry in os.scandir(cacheDir)
+                   if entry.name.endswith('.npz')]
+        if len(entries) > RESULT_CACHE_SIZE:
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - RESULT_CACHE_SIZE]:
+                os.remove(entry.path)
+    except (IOError, OSError, TypeError):
+        pass
+    finally:
+        if os.path.exists(tmpFile):
+            os.remove(tmpFile)
+
+# gets the number of frames in a given profiler file (or ArcMovie).
+@_instrumented('getNumFrames')
+def getNumFrames(filename):
+    if isinstance(filename, ArcMovie):
+        return len(filename)
+    movie = _loadSidecarFrames(filename)
+    if movie is not None:
+        return movie[1].shape[0]
+    
+    numframes = 0
+    for line in iterArcLines(filename):
+        numframes += 1
+    return numframes
+            
+
+######Arc analysis functions#####
+
+#Iterates over the raw frame rows of a profiler 'movie'. The file is
+# memory mapped and the 'Frames:' marker is searched only once, so only
+# the row being looked at is ever copied out of the file.
+def iterArcLines(filename):
+    with open(filename,"rb") as f:
+        arc_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    pos = 0
+    try:
+        frameline = arc_data.rfind(b'Frames:')
+        if frameline == -1:
+            raise ValueError("No 'Frames:' section found in %s" % filename)
+        
+        #the line following 'Frames:' holds the column titles
+        pos = arc_data.find(b'\n', frameline) + 1
+        pos = arc_data.find(b'\n', pos) + 1
+        while 0 < pos < len(arc_data):
+            end = arc_data.find(b'\n', pos)
+            if end == -1:
+                end = len(arc_data)
+            line = arc_data[pos:end]
+            pos = end + 1
+            if line.strip():
+                yield line
+    finally:
+        if _recorders.get():
+            _record('iterArcLines', calls=1,
+                    bytesRead=min(max(pos, 0), len(arc_data)))
+        arc_data.close()
+
+#Profiler exports use decimal commas or points depending on the locale,
+# commas are turned into points over a whole block of rows at once
+_DECIMAL_POINT = bytes.maketrans(b',', b'.')
+
+#Per row path of parseArcLines, every row is split and converted on its
+# own. Used for rows that the bulk parse rejects (eg rows of different
+# lengths).
+def _parseArcRows(lines):
+    rows = [line.translate(_DECIMAL_POINT).split() for line in lines]
+    frameHeader = numpy.array([row[0:3] for row in rows]).astype(str)
+    AB_Frames = numpy.array([row[3:66] for row in rows], dtype=float)
+    GT_Frames = numpy.array([row[66:131] for row in rows], dtype=float)
+    return frameHeader, AB_Frames, GT_Frames
+
+#Splits a list of frame rows into the header columns (columns 0-2) and
+# the AB (columns 3-65) and GT (columns 66-130) data. The data columns
+# of all the rows are converted by a single numpy.loadtxt call.
+@_instrumented('parseArcLines')
+def parseArcLines(lines):
+    if _recorders.get():
+        _record('parseArcLines', frames=len(lines))
+    if not lines:
+        return _parseArcRows(lines)
+    lines = b'\n'.join(lines).translate(_DECIMAL_POINT).split(b'\n')
+    try:
+        frames = numpy.loadtxt(lines, dtype=float, comments=None,
+                               usecols=range(3, 131), ndmin=2)
+    except ValueError:
+        return _parseArcRows(lines)
+    frameHeader = numpy.array([line.split(None, 3)[0:3] 
+                               for line in lines]).astype(str)
+    AB_Frames = numpy.ascontiguousarray(frames[:,0:63])
+    GT_Frames = numpy.ascontiguousarray(frames[:,63:128])
+    return frameHeader, AB_Frames, GT_Frames
+
+#Generator reading a profiler 'movie' by blocks of at most chunkSize
+# frames, so memory use stays bounded whatever the length of the movie.
+# yields the frame numbers (starting at 1), header columns, and AB and GT
+# data of each block as (frames x detectors) arrays. filename may also
+# be an ArcMovie.
+def iterArcFrames(filename, chunkSize=256):
+    if isinstance(filename, ArcMovie):
+        movie = filename
+    else:
+        movie = _loadSidecarFrames(filename)
+    if movie is not None:
+        [frameHeader, AB_Frames, GT_Frames] = movie
+        for start in range(0, AB_Frames.shape[0], chunkSize):
+            stop = start + chunkSize
+            yield (numpy.arange(start+1, start+1+len(AB_Frames[start:stop])),
+                   frameHeader[start:stop], AB_Frames[start:stop],
+                   GT_Frames[start:stop])
+        return
+    
+    firstFrame = 1
+    lines = []
+    for line in iterArcLines(filename):
+        lines.append(line)
+        if len(lines) == chunkSize:
+            [frameHeader, AB_Frames, GT_Frames] = parseArcLines(lines)
+            yield (numpy.arange(firstFrame, firstFrame+len(lines)),
+                   frameHeader, AB_Frames, GT_Frames)
+            firstFrame += len(lines)
+            lines = []
+    if lines:
+        [frameHeader, AB_Frames, GT_Frames] = parseArcLines(lines)
+        yield (numpy.arange(firstFrame, firstFrame+len(lines)),
+               frameHeader, AB_Frames, GT_Frames)
+
+#extracts a particular frame's AB and GT data and returns two lists. 
+# frameNum starts at 1. filename may also be an ArcMovie.
+@_instrumented('extractArcFrame')
+def extractArcFrame(filename,frameNum):
+    if isinstance(filename, ArcMovie):
+        [AB_Frame, GT_Frame] = filename.frame(frameNum)
+        return list(AB_Frame), list(GT_Frame)
+    movie = _loadSidecarFrames(filename)
+    if movie is not None:
+        return list(movie[1][int(frameNum)-1]), list(movie[2][int(frameNum)-1])
+    
+    for [frame, line] in enumerate(iterArcLines(filename), 1):
+        if frame == int(frameNum):
+            [frameHeader, AB_Frame, GT_Frame] = parseArcLines([line])
+            return list(AB_Frame[0]), list(GT_Frame[0])
+            
+#Loads a whole profiler 'movie' in a single pass over the file.
+# returns the per-frame header columns (columns 0-2) as strings and the
+# AB (columns 3-65) and GT (columns 66-130) data as (frames x detectors)
+# arrays. Row 0 holds frame 1. An ArcMovie is returned as these arrays.
+@_instrumented('loadArcMovie')
+def loadArcMovie(filename):
+    if isinstance(filename, ArcMovie):
+        return tuple(filename)
+    movie = _loadSidecarFrames(filename)
+    if movie is not None:
+        return movie
+    return parseArcLines(list(iterArcLines(filename)))
+
+#Dropped counts rejection: a frame whose error exceeds the threshold is
+#rejected along with the numFrames2skip frames that follow it, and frames
+#inside such a window are never checked themselves. exceeds flags the
+#frames over the threshold, framesLeft2skip the frames still to skip from
+#a previous block. Returns the mask of accepted frames, the number of
+#frames that triggered a skip (numSkippedFrames) and the frames left to
+#skip after the block. Only the frames over the threshold are looked at
+#one by one, the mask is built with array operations.
+def acceptedFrameMask(exceeds, numFrames2skip, framesLeft2skip=0):
+    numFrames = len(exceeds)
+    #frames from nextFrame on are checked against the threshold
+    nextFrame = framesLeft2skip
+    triggers = []
+    for i in numpy.flatnonzero(exceeds):
+        if i >= nextFrame:
+            triggers.append(i)
+            nextFrame = i + numFrames2skip + 1
+    
+    #+1 at the start and -1 after the end of each rejected window
+    windowStarts = numpy.array([0] + triggers, dtype=numpy.int64)
+    windowEnds = numpy.minimum(numpy.array([framesLeft2skip] + 
+                 [i + numFrames2skip + 1 for i in triggers]), numFrames)
+    rejected = numpy.zeros(numFrames + 1, dtype=numpy.int64)
+    numpy.add.at(rejected, numpy.minimum(windowStarts, numFrames), 1)
+    numpy.add.at(rejected, windowEnds, -1)
+    accepted = numpy.cumsum(rejected[:numFrames]) == 0
+    
+    return accepted, len(triggers), max(nextFrame - numFrames, 0)
+
+#Whether value replaces maximum as the running maximum of errors. A NaN
+#error (eg. a profile without 25% crossings) becomes the maximum and is
+#never replaced, so that it shows in the results instead of passing as 0.
+def _exceedsMaximum(value, maximum):
+    if maximum != maximum:
+        return False
+    return value > maximum or value != value
+
+#Running statistics of an arc analysis. Blocks of consecutive frames are
+#fed to update() as they are read and results() gives the analyzeArc
+#results for the frames seen so far.
+#Accumulators of consecutive parts of a movie can be combined with
+#merge(). The part following a frame exceeding the threshold must then
+#be accumulated with framesLeft2skip set to the frames left to skip
+#at its start (see parallelArcAccumulator).
+class ArcAccumulator(object):
+    def __init__(self, particletype, framesLeft2skip=0):
+        self.config = getBeamConfig(particletype)
+        self.numFrames = 0 #last frame seen
+        self.count = 0 #frames used in the averages
+        self.avgABsum = 0
+        self.avgGTsum = 0
+        self.overallAB_avg_maximum = 0 #Highest AB error
+        self.overallGT_avg_maximum = 0 #Higherst GT error
+        #The frame that has the max avg error in AB (to be converted to an angle):
+        self.frameABavg_max = 0
+        #The frame that has the max avg error in GT (to be converted to an angle):
+        self.frameGTavg_max = 0
+        self.numSkippedFrames = 0
+        #frames still to be skipped after a frame exceeding the threshold
+        self.framesLeft2skip = framesLeft2skip
+        #per frame errors of the frames used in the averages, kept for the
+        #per angle results
+        self.acceptedFrames = []
+        self.acceptedErrors = []
+    
+    #frameNums must follow the frames of the previous update, the errors
+    #are the ones returned by computeErrorBatch. Returns the mask of the
+    #frames used in the averages.
+    def update(self, frameNums, averageABErrors, averageGTErrors, ABmaxs,
+               GTmaxs):
+        config = self.config
+        frameNums = numpy.asarray(frameNums)
+        averageABErrors = numpy.asarray(averageABErrors)
+        averageGTErrors = numpy.asarray(averageGTErrors)
+        if len(frameNums) == 0:
+            return numpy.zeros(0, dtype=bool)
+        self.numFrames = int(frameNums[-1])
+        
+        #the first frames are not analyzed at all
+        accepted = frameNums >= config.startFrame
+        exceeds = ((averageABErrors[accepted] > config.threshold) |
+                   (averageGTErrors[accepted] > config.threshold))
+        [accepted[accepted], numSkippedFrames,
+         self.framesLeft2skip] = acceptedFrameMask(exceeds,
+                                 config.numFrames2skip, self.framesLeft2skip)
+        self.numSkippedFrames += numSkippedFrames
+        if not accepted.any():
+            return accepted
+        
+        self.avgABsum += averageABErrors[accepted].sum()
+        self.avgGTsum += averageGTErrors[accepted].sum()
+        self.count += int(accepted.sum())
+        
+        #argmax returns the first maximum, like the frame by frame loop
+        #did, or the first NaN, which then stays the maximum
+        acceptedFrames = frameNums[accepted]
+        i = numpy.argmax(averageABErrors[accepted])
+        if _exceedsMaximum(averageABErrors[accepted][i],
+                           self.overallAB_avg_maximum):
+            self.overallAB_avg_maximum = averageABErrors[accepted][i]
+            self.frameABavg_max = int(acceptedFrames[i])
+        i = numpy.argmax(averageGTErrors[accepted])
+        if _exceedsMaximum(averageGTErrors[accepted][i],
+                           self.overallGT_avg_maximum):
+            self.overallGT_avg_maximum = averageGTErrors[accepted][i]
+            self.frameGTavg_max = int(acceptedFrames[i])
+        
+        self.acceptedFrames.append(acceptedFrames)
+        self.acceptedErrors.append(numpy.column_stack(
+        [averageABErrors, averageGTErrors, ABmaxs, GTmaxs])[accepted])
+        return accepted
+    
+    #Adds the statistics of 'other', which accumulated the frames that
+    #follow the frames of this accumulator
+    def merge(self, other):
+        self.numFrames = max(self.numFrames, other.numFrames)
+        self.count += other.count
+        self.avgABsum += other.avgABsum
+        self.avgGTsum += other.avgGTsum
+        #on ties the earlier frame is kept, as when frames are read in order
+        if _exceedsMaximum(other.overallAB_avg_maximum,
+                           self.overallAB_avg_maximum):
+            self.overallAB_avg_maximum = other.overallAB_avg_maximum
+            self.frameABavg_max = other.frameABavg_max
+        if _exceedsMaximum(other.overallGT_avg_maximum,
+                           self.overallGT_avg_maximum):
+            self.overallGT_avg_maximum = other.overallGT_avg_maximum
+            self.frameGTavg_max = other.frameGTavg_max
+        self.numSkippedFrames += other.numSkippedFrames
+        self.framesLeft2skip = other.framesLeft2skip
+        self.acceptedFrames.extend(other.acceptedFrames)
+        self.acceptedErrors.extend(other.acceptedErrors)
+        return self
+    
+    #Converts frame numbers to bipolar angles. numFrames is the length of
+    #the movie, by default the frames seen so far.
+    def frameAngles(self, frames, numFrames=None):
+        if numFrames is None:
+            numFrames = self.numFrames
+        startAngle = self.config.startAngle #bipolar
+        stopAngle = self.config.stopAngle #bipolar
+        return ((stopAngle-startAngle)*frames/numFrames) - stopAngle
+    
+    #numFrames is the length of the movie, by default the frames seen so far
+    def results(self, numFrames=None):
+        overallAvgAB = self.avgABsum/(self.count + 0.00001)
+        overallAvgGT = self.avgGTsum/(self.count + 0.00001)
+        #Convert frame numbers where we find the maximum 
+        #average difference to a bipolar angle:
+        angleABavg_max = self.frameAngles(self.frameABavg_max, numFrames)
+        angleGTavg_max = self.frameAngles(self.frameGTavg_max, numFrames)
+    
+        return [overallAvgAB, overallAvgGT, self.overallAB_avg_maximum,
+                angleABavg_max, self.overallGT_avg_maximum, angleGTavg_max,
+                self.numSkippedFrames]
+    
+    #Per frame results: a (frames x 5) array holding the number, average
+    #AB error, average GT error, AB max and GT max of each frame used in
+    #the averages
+    def frameResults(self):
+        if not self.acceptedFrames:
+            return numpy.zeros((0, 5))
+        return numpy.column_stack([numpy.concatenate(self.acceptedFrames),
+                                   numpy.concatenate(self.acceptedErrors)])
+    
+    #Per angle results: each frame used in the averages is converted to a
+    #bipolar angle and goes to the bin of the nearest config.angleBins
+    #angle. Returns a (bins x 4) array whose row i holds the average AB
+    #error, average GT error, AB max and GT max of the frames of bin i
+    #(NaN for empty bins).
+    def angleBinResults(self, numFrames=None):
+        if numFrames is None:
+            numFrames = self.numFrames
+        config = self.config
+        numBins = len(config.angleBins)
+        binned = numpy.full((numBins, 4), numpy.nan)
+        if not self.acceptedFrames:
+            return binned
+        
+        frames = numpy.concatenate(self.acceptedFrames)
+        errors = numpy.concatenate(self.acceptedErrors)
+        angles = ((config.stopAngle-config.startAngle)*frames/float(numFrames)
+                  - config.stopAngle)
+        bins = numpy.searchsorted(config.angleBinEdges, angles)
+        
+        counts = numpy.bincount(bins, minlength=numBins)
+        filled = counts > 0
+        for column in (0, 1):
+            sums = numpy.bincount(bins, weights=errors[:,column],
+                                  minlength=numBins)
+            binned[filled,column] = sums[filled]/counts[filled]
+        for column in (2, 3):
+            maxima = numpy.full(numBins, -numpy.inf)
+            numpy.maximum.at(maxima, bins, errors[:,column])
+            binned[filled,column] = maxima[filled]
+        return binned
+
+#Runs the analysis of an arc and returns its ArcAccumulator
+@_instrumented('analyzeArc')
+def arcAccumulator(filename, referencefilename, particletype):
+    config = getBeamConfig(particletype)
+    [AB_refDist, AB_refData, GT_refDist, GT_refData, ABflatness_ref,
+     ABsymmetry_ref, GTflatness_ref,
+     GTsymmetry_ref] = _asReference(referencefilename, config.caxCorrect)
+    
+    accumulator = ArcAccumulator(config)
+    
+    #frames are analyzed block by block while the movie is being read
+    for [frameNums, frameHeader, AB_Frames, GT_Frames] in iterArcFrames(
+                                                                 filename):
+        [averageABErrors, averageGTErrors, ABmaxs, GTmaxs] = computeErrorBatch(
+        AB_Frames, GT_Frames, AB_refData, GT_refData, config)
+        accumulator.update(frameNums, averageABErrors, averageGTErrors,
+                           ABmaxs, GTmaxs)
+
+    if _recorders.get():
+        _record('analyzeArc', frames=accumulator.numFrames)
+    return accumulator
+
+#This functions analyzes
+@_memoized
+def analyzeArc(filename,referencefilename, particletype):
+    analyzeArc_return = arcAccumulator(filename, referencefilename,
+                                       particletype).results()
+    return analyzeArc_return
+
+#Same as analyzeArc, but also returns the per angle results
+#(see ArcAccumulator.angleBinResults)
+@_memoized
+def analyzeArcByAngle(filename, referencefilename, particletype):
+    accumulator = arcAccumulator(filename, referencefilename, particletype)
+    return accumulator.results(), accumulator.angleBinResults()
+
+#### Parallel arc analysis ####
+#Byte ranges (start, end) of the frame rows of a profiler 'movie'
+def arcFrameRanges(filename):
+    with open(filename,"rb") as f:
+        arc_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        frameline = arc_data.rfind(b'Frames:')
+        if frameline == -1:
+            raise ValueError("No 'Frames:' section found in %s" % filename)
+        #the line following 'Frames:' holds the column titles
+        start = arc_data.find(b'\n', arc_data.find(b'\n', frameline) + 1) + 1
+        if start == 0:
+            return numpy.zeros((0, 2), dtype=numpy.int64)
+        
+        #every newline of the frames section, found in one vectorized scan
+        section = numpy.frombuffer(arc_data, dtype=numpy.uint8, offset=start)
+        newlines = numpy.flatnonzero(section == ord(b'\n')) + start
+        del section
+        if newlines.size == 0 or newlines[-1] != len(arc_data) - 1:
+            newlines = numpy.append(newlines, len(arc_data))
+        ranges = numpy.column_stack([numpy.concatenate([[start],
+                                                        newlines[:-1] + 1]),
+                                     newlines])
+        
+        #drop blank lines, frame rows are hundreds of bytes long
+        short = numpy.flatnonzero(ranges[:,1] - ranges[:,0] < 16)
+        blank = [i for i in short if not
+                 arc_data[ranges[i,0]:ranges[i,1]].strip()]
+        return numpy.delete(ranges, blank, axis=0)
+    finally:
+        arc_data.close()
+
+#Worker of parallelArcAccumulator: analyzes the frames firstFrame, ... of
+#the byte range [start, end) (or of an ArcMovie holding just these
+#frames) once for every possible number of frames left to skip at its
+#start, returns one accumulator per number
+def _arcChunkAccumulators(job):
+    [filename, start, end, firstFrame, AB_refData, GT_refData, config] = job
+    if isinstance(filename, ArcMovie):
+        [frameHeader, AB_Frames, GT_Frames] = filename
+    else:
+        with open(filename,"rb") as f:
+            f.seek(start)
+            lines = [line for line in f.read(end - start).split(b'\n')
+                     if line.strip()]
+        [frameHeader, AB_Frames, GT_Frames] = parseArcLines(lines)
+    frameNums = numpy.arange(firstFrame, firstFrame + len(AB_Frames))
+    errors = computeErrorBatch(AB_Frames, GT_Frames, AB_refData, GT_refData,
+                               config)
+    
+    accumulators = []
+    for framesLeft2skip in range(0, config.numFrames2skip + 1):
+        accumulator = ArcAccumulator(config, framesLeft2skip)
+        accumulator.update(frameNums, *errors)
+        accumulators.append(accumulator)
+    return accumulators
+
+#Same as arcAccumulator, with the frames split in chunks of chunkFrames
+#frames analyzed by 'jobs' worker processes (or threads with
+#useThreads=True). The chunks are then merged in order: the skip state
+#at the end of a chunk selects which accumulator of the next chunk is
+#merged, so frames are skipped exactly as in a sequential analysis.
+def parallelArcAccumulator(filename, referencefilename, particletype,
+                           jobs=None, chunkFrames=1000, useThreads=False):
+    config = getBeamConfig(particletype)
+    [AB_refDist, AB_refData, GT_refDist, GT_refData, ABflatness_ref,
+     ABsymmetry_ref, GTflatness_ref,
+     GTsymmetry_ref] = _asReference(referencefilename, config.caxCorrect)
+    
+    if isinstance(filename, ArcMovie):
+        #the workers only receive the frames of their chunk
+        work = [(ArcMovie(filename.frameHeader[first:first + chunkFrames],
+                          filename.AB_Frames[first:first + chunkFrames],
+                          filename.GT_Frames[first:first + chunkFrames],
+                          dtype=filename.AB_Frames.dtype), 0, 0, first + 1,
+                 AB_refData, GT_refData, config)
+                for first in range(0, len(filename), chunkFrames)]
+    else:
+        ranges = arcFrameRanges(filename)
+        work = [(filename, int(ranges[first,0]),
+                 int(ranges[min(first + chunkFrames, len(ranges)) - 1, 1]),
+                 first + 1, AB_refData, GT_refData, config)
+                for first in range(0, len(ranges), chunkFrames)]
+    
+    worker = _arcChunkAccumulators
+    if useThreads:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+        worker = _inCallerContext(worker)
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    accumulator = ArcAccumulator(config)
+    with pool:
+        for chunkAccumulators in pool.map(worker, work):
+            accumulator.merge(chunkAccumulators[accumulator.framesLeft2skip])
+    return accumulator
+
+#Same results as analyzeArc, see parallelArcAccumulator
+def analyzeArcParallel(filename, referencefilename, particletype, jobs=None,
+                       chunkFrames=1000, useThreads=False):
+    return parallelArcAccumulator(filename, referencefilename, particletype,
+                                  jobs, chunkFrames, useThreads).results()
+
+#Follows a profiler 'movie' while it is being acquired, like 'tail -f'.
+#Only the rows appended since the previous poll are read and analyzed,
+#and the analyzeArc results of the frames acquired so far are yielded
+#after each poll that brought new frames (the angles are relative to
+#the frames acquired so far). Stops once the file has not grown for
+#idleTimeout seconds, or never if idleTimeout is None.
+def followArc(filename, referencefilename, particletype, pollInterval=1.0,
+              idleTimeout=None):
+    config = getBeamConfig(particletype)
+    [AB_refDist, AB_refData, GT_refDist, GT_refData, ABflatness_ref,
+     ABsymmetry_ref, GTflatness_ref,
+     GTsymmetry_ref] = _asReference(referencefilename, config.caxCorrect)
+    
+    accumulator = ArcAccumulator(config)
+    pending = b'' #bytes read but not analyzed yet
+    inFrames = False #past the 'Frames:' marker and column titles
+    lastGrowth = time.time()
+    
+    with open(filename,"rb") as f:
+        while True:
+            newData = f.read()
+            idle = not newData
+            if newData:
+                lastGrowth = time.time()
+                pending += newData
+            elif (idleTimeout is not None and 
+                  time.time() - lastGrowth >= idleTimeout):
+                #acquisition is over, the last row may lack its newline
+                if inFrames and pending.strip():
+                    pending += b'\n'
+                    idle = False
+                else:
+                    return
+            
+            if not inFrames:
+                frameline = pending.rfind(b'Frames:')
+                titleEnd = pending.find(b'\n', pending.find(b'\n',
+                                                           frameline) + 1)
+                if frameline != -1 and titleEnd != -1:
+                    pending = pending[titleEnd+1:]
+                    inFrames = True
+            
+            lastNewline = pending.rfind(b'\n')
+            if inFrames and lastNewline != -1:
+                lines = [line for line in pending[:lastNewline].split(b'\n')
+                         if line.strip()]
+                pending = pending[lastNewline+1:]
+                if lines:
+                    [frameHeader, AB_Frames, GT_Frames] = parseArcLines(lines)
+                    frameNums = numpy.arange(accumulator.numFrames + 1, 
+                                        accumulator.numFrames + 1 + len(lines))
+                    [averageABErrors, averageGTErrors, ABmaxs,
+                     GTmaxs] = computeErrorBatch(AB_Frames, GT_Frames,
+                                                 AB_refData, GT_refData,
+                                                 config)
+                    accumulator.update(frameNums, averageABErrors,
+                                       averageGTErrors, ABmaxs, GTmaxs)
+                    yield accumulator.results()
+            
+            if idle:
+                time.sleep(pollInterval)
+
+#### Static and general analysis functions ####     
+# Load a profiler file and split it in AB and GT. 
+# returns AB coordinates, AB data, GT coordinates, GT data,
+# AB flatness value, AB symmetry value. GT flatness value
+# and GT symmetry value
+# filename may also be a ProfilerMeasurement, which is CAX corrected if
+# needed (see _asMeasurement)
+
+@_instrumented('load_profilerFile')
+def load_profilerFile(filename, caxCorrect=True):
+    if isinstance(filename, ProfilerMeasurement):
+        return list(_asMeasurement(filename, caxCorrect))
+    
+    #use the binary sidecar written by convertProfilerFile if up to date
+    sidecar = _openSidecar(filename)
+    if sidecar is not None and 'ABdist' in sidecar:
+        with sidecar:
+            [ABdist, ABdata, GTdist, GTdata] = [sidecar['ABdist'],
+            sidecar['ABdata'], sidecar['GTdist'], sidecar['GTdata']]
+            [ABflatness, ABsymmetry, GTflatness,
+             GTsymmetry] = [float(value) for value in sidecar['header']]
+    else:
+        if sidecar is not None:
+            sidecar.close()
+        [ABdist, ABdata, GTdist, GTdata, ABflatness, ABsymmetry, GTflatness,
+         GTsymmetry] = parseProfilerFile(filename)
+    
+    if not caxCorrect:
+        return [ABdist, ABdata, GTdist, GTdata, ABflatness, ABsymmetry,
+                GTflatness, GTsymmetry]
+    
+    #perform caxcorrection:
+    ABdataCAXCORRECTED = caxcorrect(ABdist,ABdata)
+    GTdataCAXCORRECTED = caxcorrect(GTdist,GTdata)
+    
+    
+    load_profilerFile_return = [ABdist, ABdataCAXCORRECTED, GTdist,
+    GTdataCAXCORRECTED, ABflatness, ABsymmetry, GTflatness, GTsymmetry]
+    return  load_profilerFile_return
+
+#Parses the text of a profiler file, same returns as load_profilerFile
+# but without CAX correction
+def parseProfilerFile(filename):
+    return parseProfilerText(readFileBuffer(filename).decode('latin-1'))
+
+#Section anchors, compared to lines stripped of all white space
+_SECTION_ANCHORS = ('XAxisAnalysis', 'YAxisAnalysis',
+                    'DetectorIDXAxis', 'DetectorIDYAxis')
+
+#Parses the text of a profiler export in a single sweep over its lines.
+#The detector blocks are converted to floats in one go.
+def parseProfilerText(text):
+    profiler_data = text.splitlines()
+    
+    #line index of each section, the last occurrence wins
+    sections = dict()
+    for [j, line] in enumerate(profiler_data[:-1]):
+        if 'Axis' in line:
+            anchor = ''.join(line.split())
+            for name in _SECTION_ANCHORS:
+                if name in anchor:
+                    sections[name] = j
+    
+    missing = [name for name in _SECTION_ANCHORS if name not in sections]
+    if missing:
+        raise ValueError('Profiler sections not found: %s' % 
+                         ', '.join(missing))
+    
+    #find AB and GT flatness and symmetry
+    j = sections['XAxisAnalysis']
+    ABflatness = _percentValue(profiler_data[j+7])
+    ABsymmetry = _percentValue(profiler_data[j+8])
+    j = sections['YAxisAnalysis']
+    GTflatness = _percentValue(profiler_data[j+7])
+    GTsymmetry = _percentValue(profiler_data[j+8])
+    
+    #find AB and GT data
+    [ABdist, ABdata] = _detectorBlock(profiler_data, 
+                                      sections['DetectorIDXAxis'], 63)
+    [GTdist, GTdata] = _detectorBlock(profiler_data,
+                                      sections['DetectorIDYAxis'], 65)
+    
+    return [ABdist, ABdata, GTdist, GTdata, ABflatness, ABsymmetry,
+            GTflatness, GTsymmetry]
+
+def _percentValue(line):
+    return float(line.split('perc')[1].replace(',', '.'))
+
+#returns the positions and values of the numDetectors lines
+#following line j
+def _detectorBlock(profiler_data, j, numDetectors):
+    block = ' '.join([' '.join(line.split()[0:2]) for line in 
+                      profiler_data[j+1:j+1+numDetectors]])
+    block = numpy.array(block.replace(',', '.').split(), dtype=float)
+    block = block.reshape(numDetectors, 2)
+    return block[:,0], block[:,1]
+
+
+#### Reference cache ####
+# References almost never change, so once parsed and CAX corrected they
+# are kept in memory (least recently used first) and, if
+# REFERENCE_CACHE_DIR is set, in a compact .npz file in that directory.
+# An entry is only reused while the reference keeps the same
+# modification time and size.
+REFERENCE_CACHE_SIZE = 32
+REFERENCE_CACHE_DIR = None
+_referenceCache = collections.OrderedDict()
+
+#Same as load_profilerFile but goes through the reference cache.
+#The returned arrays are shared between callers and are read-only.
+@_instrumented('loadReference')
+def loadReference(filename, cacheDir=None, caxCorrect=True):
+    if cacheDir is None:
+        cacheDir = REFERENCE_CACHE_DIR
+    
+    filename = os.path.abspath(filename)
+    stat = os.stat(filename)
+    stamp = (stat.st_mtime, stat.st_size)
+    key = (filename, caxCorrect)
+    
+    entry = _referenceCache.pop(key, None)
+    if entry is None or entry[0] != stamp:
+        reference = None
+        if cacheDir is not None:
+            cacheFile = _referenceCacheFile(filename, cacheDir, caxCorrect)
+            reference = _readReferenceCache(cacheFile, stamp)
+        if reference is None:
+            reference = load_profilerFile(filename, caxCorrect)
+            if cacheDir is not None:
+                _writeReferenceCache(cacheFile, stamp, reference)
+        reference = ([numpy.array(data, dtype=float) for data in reference[0:4]]
+                     + [float(value) for value in reference[4:8]])
+        for data in reference[0:4]:
+            data.setflags(write=False)
+        entry = (stamp, reference)
+    
+    _referenceCache[key] = entry
+    while len(_referenceCache) > REFERENCE_CACHE_SIZE:
+        _referenceCache.popitem(last=False)
+    return list(entry[1])
+
+#entries are named after the file name, for readability, and a hash of
+#the absolute path, so that references with the same name in different
+#directories do not share an entry
+def _referenceCacheFile(filename, cacheDir, caxCorrect):
+    suffix = '.npz' if caxCorrect else '.raw.npz'
+    pathHash = hashlib.blake2b(os.path.abspath(filename).encode('utf-8'),
+                               digest_size=8).hexdigest()
+    return os.path.join(cacheDir, '%s.%s%s' % (os.path.basename(filename),
+                                               pathHash, suffix))
+
+#returns the cached reference or None if it is missing or out of date
+def _readReferenceCache(cacheFile, stamp):
+    try:
+        with numpy.load(cacheFile) as cached:
+            if tuple(cached['stamp']) != stamp:
+                return None
+            return [cached['ABdist'], cached['ABdata'], cached['GTdist'],
+                    cached['GTdata']] + list(cached['header'])
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+#the disk cache is only an optimization, failing to write it is not fatal
+def _writeReferenceCache(cacheFile, stamp, reference):
+    try:
+        cacheDir = os.path.dirname(cacheFile)
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        _saveNpz(cacheFile,
+                 stamp=numpy.array(stamp, dtype=float),
+                 ABdist=reference[0], ABdata=reference[1],
+                 GTdist=reference[2], GTdata=reference[3],
+                 header=numpy.array(reference[4:8], dtype=float))
+    except (IOError, OSError):
+        pass
+
+#writes arrays to an .npz file through a temporary file, so readers never
+# see a partially written file
+def _saveNpz(npzFile, **arrays):
+    tmpFile = '%s.%d.tmp' % (npzFile, os.getpid())
+    try:
+        with open(tmpFile, 'wb') as f:
+            numpy.savez(f, **arrays)
+        os.replace(tmpFile, npzFile)
+    finally:
+        if os.path.exists(tmpFile):
+            os.remove(tmpFile)
+
+
+#### Binary sidecar files ####
+# Parsing the text exports dominates re-analysis of archived files.
+# convertProfilerFile (run by the batch analyses with --write-sidecars)
+# stores everything the analysis needs in an .npz sidecar next to the
+# text file (measurement.txt -> measurement.npz), which load_profilerFile
+# and the arc functions read instead of the text as long as the text
+# file keeps the modification time and size it had when the sidecar was
+# written (a copy keeping an old date is not mistaken for the original).
+def sidecarFile(filename):
+    return os.path.splitext(filename)[0] + '.npz'
+
+#Modification time and size identifying the version of a file
+def _fileStamp(filename):
+    stat = os.stat(filename)
+    return (stat.st_mtime, stat.st_size)
+
+#Writes the sidecar of a profiler file: the AB/GT distances, data
+#(not CAX corrected) and flatness/symmetry values of static exports
+#and the full frame matrix of movies. Returns the sidecar file name.
+def convertProfilerFile(filename):
+    #taken before parsing, a file changed meanwhile is not trusted
+    arrays = dict(stamp=numpy.array(_fileStamp(filename), dtype=float))
+    try:
+        [ABdist, ABdata, GTdist, GTdata, ABflatness, ABsymmetry, GTflatness,
+         GTsymmetry] = parseProfilerFile(filename)
+        arrays.update(ABdist=ABdist, ABdata=ABdata, GTdist=GTdist,
+                      GTdata=GTdata, header=[ABflatness, ABsymmetry,
+                                             GTflatness, GTsymmetry])
+    except (IndexError, ValueError):
+        pass #no static analysis sections in this file
+    
+    try:
+        lines = list(iterArcLines(filename))
+    except ValueError:
+        lines = [] #not a movie
+    if lines:
+        [frameHeader, AB_Frames, GT_Frames] = parseArcLines(lines)
+        arrays.update(frameHeader=frameHeader, AB_Frames=AB_Frames,
+                      GT_Frames=GT_Frames)
+    
+    if len(arrays) == 1:
+        raise ValueError('No profiler data found in %s' % filename)
+    sidecar = sidecarFile(filename)
+    _saveNpz(sidecar, **arrays)
+    return sidecar
+
+#Opens the sidecar of filename if it was written from the current
+#version of filename, returns None otherwise
+def _openSidecar(filename):
+    sidecar = sidecarFile(filename)
+    try:
+        if not os.path.exists(sidecar):
+            return None
+        stamp = _fileStamp(filename)
+        npz = numpy.load(sidecar)
+    except (IOError, OSError, ValueError):
+        return None
+    if 'stamp' not in npz or tuple(npz['stamp']) != stamp:
+        npz.close()
+        return None
+    return npz
+
+#Reads the frames of a movie from its sidecar,
+#returns None if there is no up to date sidecar holding frames
+def _loadSidecarFrames(filename):
+    sidecar = _openSidecar(filename)
+    if sidecar is None:
+        return None
+    with sidecar:
+        if 'AB_Frames' not in sidecar:
+            return None
+        if _recorders.get():
+            _record('sidecar', calls=1, 
+                    bytesRead=os.path.getsize(sidecarFile(filename)))
+        return sidecar['frameHeader'], sidecar['AB_Frames'], sidecar['GT_Frames']
+
+
+#### Profile data model ####
+# Measurements kept in memory (eg. years of them for trending) hold their
+# data in contiguous NumPy arrays rather than lists of python floats, and
+# __slots__ leaves out the per instance dictionary. Both classes unpack
+# like the lists returned by load_profilerFile and loadArcMovie, and every
+# analysis function accepts them in place of a file name. dtype may be
+# numpy.float32 to halve the memory of archived data, the errors are
+# always computed in double precision.
+
+#A static export: AB and GT coordinates and data and the flatness and
+#symmetry values of its header
+class ProfilerMeasurement(object):
+    __slots__ = ('ABdist', 'ABdata', 'GTdist', 'GTdata', 'ABflatness',
+                 'ABsymmetry', 'GTflatness', 'GTsymmetry', 'caxCorrected',
+                 'filename', 'contentHash')
+    
+    def __init__(self, ABdist, ABdata, GTdist, GTdata, ABflatness,
+                 ABsymmetry, GTflatness, GTsymmetry, caxCorrected=False,
+                 filename=None, dtype=float, contentHash=None):
+        [self.ABdist, self.ABdata, self.GTdist, self.GTdata] = [
+        numpy.ascontiguousarray(data, dtype=dtype) 
+        for data in (ABdist, ABdata, GTdist, GTdata)]
+        self.ABflatness = float(ABflatness)
+        self.ABsymmetry = float(ABsymmetry)
+        self.GTflatness = float(GTflatness)
+        self.GTsymmetry = float(GTsymmetry)
+        self.caxCorrected = caxCorrected
+        self.filename = filename
+        #hash of the file content it was parsed from, see contentHash
+        self.contentHash = contentHash
+    
+    #Loads a static export, see load_profilerFile
+    @classmethod
+    def load(cls, filename, caxCorrect=True, dtype=float):
+        return cls(*load_profilerFile(filename, caxCorrect),
+                   caxCorrected=caxCorrect, filename=filename, dtype=dtype)
+    
+    def __repr__(self):
+        return 'ProfilerMeasurement(%r, caxCorrected=%r)' % (
+               self.filename, self.caxCorrected)
+    
+    #same order as the load_profilerFile list
+    def __iter__(self):
+        return iter([self.ABdist, self.ABdata, self.GTdist, self.GTdata,
+                     self.ABflatness, self.ABsymmetry, self.GTflatness,
+                     self.GTsymmetry])
+    
+    @property
+    def nbytes(self):
+        return sum(data.nbytes for data in 
+                   (self.ABdist, self.ABdata, self.GTdist, self.GTdata))
+    
+    #Views of the AB and GT data inside the analysis windows
+    def windows(self, particletype):
+        config = getBeamConfig(particletype)
+        return self.ABdata[config.ABslice], self.GTdata[config.GTslice]
+    
+    #Returns a CAX corrected copy, or this measurement if it already is
+    def caxcorrected(self):
+        if self.caxCorrected:
+            return self
+        return ProfilerMeasurement(self.ABdist, 
+               caxcorrect(self.ABdist, self.ABdata), self.GTdist,
+               caxcorrect(self.GTdist, self.GTdata), self.ABflatness,
+               self.ABsymmetry, self.GTflatness, self.GTsymmetry, True,
+               self.filename, self.ABdata.dtype, self.contentHash)
+
+#A profiler 'movie': header columns (columns 0-2) and AB and GT data
+#as (frames x detectors) arrays. Row 0 holds frame 1.
+class ArcMovie(object):
+    __slots__ = ('frameHeader', 'AB_Frames', 'GT_Frames', 'filename',
+                 'contentHash')
+    
+    def __init__(self, frameHeader, AB_Frames, GT_Frames, filename=None,
+                 dtype=float, contentHash=None):
+        self.frameHeader = numpy.asarray(frameHeader)
+        self.AB_Frames = numpy.ascontiguousarray(AB_Frames, dtype=dtype)
+        self.GT_Frames = numpy.ascontiguousarray(GT_Frames, dtype=dtype)
+        self.filename = filename
+        #hash of the file content it was parsed from, see contentHash
+        self.contentHash = contentHash
+    
+    #Loads a whole movie, see loadArcMovie
+    @classmethod
+    def load(cls, filename, dtype=float):
+        return cls(*loadArcMovie(filename), filename=filename, dtype=dtype)
+    
+    def __repr__(self):
+        return 'ArcMovie(%r, %d frames)' % (self.filename, len(self))
+    
+    def __len__(self):
+        return len(self.AB_Frames)
+    
+    #same order as the loadArcMovie tuple
+    def __iter__(self):
+        return iter([self.frameHeader, self.AB_Frames, self.GT_Frames])
+    
+    @property
+    def nbytes(self):
+        return (self.frameHeader.nbytes + self.AB_Frames.nbytes + 
+                self.GT_Frames.nbytes)
+    
+    #AB and GT data of one frame, frameNum starts at 1
+    def frame(self, frameNum):
+        return (self.AB_Frames[int(frameNum)-1], 
+                self.GT_Frames[int(frameNum)-1])
+    
+    #Views of the (frames x detectors) AB and GT data inside the analysis
+    #windows
+    def windows(self, particletype):
+        config = getBeamConfig(particletype)
+        return (self.AB_Frames[:,config.ABslice], 
+                self.GT_Frames[:,config.GTslice])
+
+#Returns measurement as a ProfilerMeasurement, loading it if it is a
+#file name
+def _asMeasurement(measurement, caxCorrect=True):
+    if not isinstance(measurement, ProfilerMeasurement):
+        return ProfilerMeasurement.load(measurement, caxCorrect)
+    if caxCorrect:
+        return measurement.caxcorrected()
+    if measurement.caxCorrected:
+        raise ValueError('%r is CAX corrected, the analysis needs the data '
+                         'without CAX correction' % (measurement,))
+    return measurement
+
+#Same as _asMeasurement, but file names go through the reference cache
+def _asReference(reference, caxCorrect=True):
+    if isinstance(reference, ProfilerMeasurement):
+        return _asMeasurement(reference, caxCorrect)
+    return ProfilerMeasurement(*loadReference(reference, 
+                               caxCorrect=caxCorrect),
+                               caxCorrected=caxCorrect, filename=reference)
+
+#### Buffered reading ####
+# Files on the network share are read whole with a few large reads and
+# then parsed from memory, and batch analyses read (and parse) the next
+# files in background threads while the current one is analyzed, so
+# the network latency overlaps with the computations.
+READ_CHUNK_SIZE = 4*1024*1024
+
+#Reads a whole file in reads of chunkSize bytes, returns a bytearray
+@_instrumented('readFileBuffer')
+def readFileBuffer(filename, chunkSize=None):
+    chunkSize = chunkSize or READ_CHUNK_SIZE
+    with open(filename, "rb", buffering=0) as f:
+        buffer = bytearray(os.fstat(f.fileno()).st_size)
+        view = memoryview(buffer)
+        size = 0
+        while size < len(buffer):
+            numRead = f.readinto(view[size:size+chunkSize])
+            if not numRead:
+                break
+            size += numRead
+        del view
+        #the file shrank or grew while being read. A one byte read tells
+        #whether it grew, without allocating a chunk for every file.
+        del buffer[size:]
+        data = f.read(1)
+        while data:
+            buffer += data
+            data = f.read(chunkSize)
+    if _recorders.get():
+        _record('readFileBuffer', bytesRead=len(buffer))
+    return buffer
+
+#Frame rows of a profiler 'movie' held in memory, see iterArcLines
+def bufferArcLines(data, filename=None):
+    frameline = data.rfind(b'Frames:')
+    if frameline == -1:
+        raise ValueError("No 'Frames:' section found in %s" % 
+                         (filename or 'buffer'))
+    #the line following 'Frames:' holds the column titles
+    start = data.find(b'\n', data.find(b'\n', frameline) + 1) + 1
+    if start == 0:
+        return []
+    return [line for line in bytes(data[start:]).split(b'\n') 
+            if line.strip()]
+
+#Parses a profiler file held in memory into a ProfilerMeasurement (not
+#CAX corrected) or an ArcMovie. mode is 'static', 'arc' or 'auto' (arc
+#if the file is a movie).
+def parseProfilerBuffer(data, mode='auto', filename=None):
+    if mode == 'auto':
+        mode = 'arc' if data.find(b'Frames:') != -1 else 'static'
+    if mode == 'arc':
+        return ArcMovie(*parseArcLines(bufferArcLines(data, filename)),
+                        filename=filename, contentHash=bufferHash(data))
+    if mode == 'static':
+        return ProfilerMeasurement(*parseProfilerText(data.decode('latin-1')),
+                                   filename=filename,
+                                   contentHash=bufferHash(data))
+    raise ValueError("mode must be 'static', 'arc' or 'auto', not %r"
+                     % (mode,))
+
+#Hex digest of the content of a file, whatever its name or date
+def contentHash(filename):
+    return bufferHash(readFileBuffer(filename))
+
+def bufferHash(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+#Reads and parses a file for a later analysis, see parseProfilerBuffer.
+#Files with an up to date sidecar are left to be read from the sidecar,
+#their name is returned.
+def loadProfilerBuffer(filename, mode='auto'):
+    sidecar = _openSidecar(filename)
+    if sidecar is not None:
+        sidecar.close()
+        return filename
+    return parseProfilerBuffer(readFileBuffer(filename), mode, filename)
+
+
+#Perform a CAX correction on the data
+#Returns the y axis (ie. AB or GT data) only
+#y0 is either one profile or a (frames x detectors) block of profiles
+#sharing the x0 coordinates, which are all corrected at once. A single
+#profile that never crosses 25% on one side raises ValueError, in a
+#block such profiles are returned as NaN.
+@_instrumented('caxcorrect')
+def caxcorrect(x0, y0):
+    x0 = numpy.asarray(x0, dtype=float)
+    y0 = numpy.asarray(y0, dtype=float)
+    profiles = numpy.atleast_2d(y0)
+    half = int(len(x0)/2)
+    
+    #find the 25% positions on each side
+    x25_A = _crossing(x0[:half], profiles[:,:half], 25)
+    x25_B = _crossing(x0[half:], profiles[:,half:], 25)
+    
+    #Shift the data by half of the difference of the 25% positions on each side
+    shift = (x25_A + x25_B)/2.0
+    if y0.ndim == 1 and numpy.isnan(shift[0]):
+        raise ValueError('The profile does not cross 25% on both sides '
+                         'of the central axis')
+    
+    #interpolate back into the original profiler coordinate system
+    #(extrapolating past both ends), the profile shifted by 'shift' is
+    #the original profile read at x0 + shift
+    xShifted = x0 + shift[:,numpy.newaxis]
+    hi = numpy.searchsorted(x0, xShifted.ravel()).reshape(xShifted.shape)
+    hi = numpy.clip(hi, 1, len(x0)-1)
+    lo = hi - 1
+    y_lo = numpy.take_along_axis(profiles, lo, axis=1)
+    y_hi = numpy.take_along_axis(profiles, hi, axis=1)
+    slope = (y_hi - y_lo)/(x0[hi] - x0[lo])
+    y_caxcorrected = slope*(xShifted - x0[lo]) + y_lo
+    
+    if y0.ndim == 1:
+        return y_caxcorrected[0]
+    return y_caxcorrected
+
+#Position where each profile reaches 'level', by linear interpolation
+#between the values just below and just above it once the values of
+#each profile are sorted
+def _crossing(x, profiles, level):
+    [x_sorted, y_sorted] = _sortProfiles(x, profiles)
+    return _sortedCrossing(x_sorted, y_sorted, level)
+
+#positions and values of each profile sorted by value
+def _sortProfiles(x, profiles):
+    order = numpy.argsort(profiles, axis=1, kind='mergesort')
+    return x[order], numpy.take_along_axis(profiles, order, axis=1)
+
+#_crossing of sorted profiles, level is one value or one per profile
+def _sortedCrossing(x_sorted, y_sorted, level):
+    level = numpy.broadcast_to(numpy.asarray(level, dtype=float),
+                               (len(y_sorted),))
+    hi = numpy.clip((y_sorted < level[:,numpy.newaxis]).sum(axis=1), 1,
+                    y_sorted.shape[1]-1)
+    rows = numpy.arange(len(y_sorted))
+    y_lo = y_sorted[rows,hi-1]
+    y_hi = y_sorted[rows,hi]
+    x_lo = x_sorted[rows,hi-1]
+    x_hi = x_sorted[rows,hi]
+    #flat profiles are outside, their division by zero is discarded below
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        crossing = x_lo + (level - y_lo)*(x_hi - x_lo)/(y_hi - y_lo)
+    
+    outside = (level < y_sorted[:,0]) | (level > y_sorted[:,-1])
+    crossing[outside] = numpy.nan
+    return crossing
+
+#### Profile metrics ####
+# Beam quality numbers computed from the detector data of every frame at
+# once, rather than read from the 'X/Y Axis Analysis' header, which only
+# static exports have. Values are relative to the central axis value
+# (position 0, interpolated):
+#   flatness: 100*(max - min)/(max + min) in the central 80% of the field
+#   symmetry: largest difference between the points at x and -x in the
+#             central 80% of the field, in % of the central axis value
+#   edges at 50%, field size between them and 80%-20% penumbra widths.
+PROFILE_METRIC_KEYS = ['flatness', 'symmetry', 'leftEdge', 'rightEdge',
+                       'fieldSize', 'penumbraLeft', 'penumbraRight']
+#Names of the columns of frameMetrics
+FRAME_METRIC_KEYS = ([key + 'AB' for key in PROFILE_METRIC_KEYS] + 
+                     [key + 'GT' for key in PROFILE_METRIC_KEYS])
+
+#Indices and weights interpolating the profiles at the positions xi,
+#the same for every profile measured at positions x (increasing)
+def _interpolationWeights(x, xi):
+    hi = numpy.clip(numpy.searchsorted(x, xi), 1, len(x)-1)
+    lo = hi - 1
+    return lo, hi, (xi - x[lo])/(x[hi] - x[lo])
+
+#Metrics of one profile (or of a (frames x detectors) block of profiles)
+#measured at the positions dist, see PROFILE_METRIC_KEYS. Returns one
+#value per metric (one row per profile), NaN where a metric cannot be
+#found (eg no 50% crossing).
+def profileMetrics(dist, profilesIn):
+    dist = numpy.asarray(dist, dtype=float)
+    profiles = numpy.atleast_2d(numpy.asarray(profilesIn, dtype=float))
+    
+    [lo, hi, weight] = _interpolationWeights(dist, numpy.zeros(1))
+    cax = (profiles[:,lo]*(1 - weight) + profiles[:,hi]*weight)[:,0]
+    
+    #same split of the two sides as caxcorrect
+    half = int(len(dist)/2)
+    crossings = []
+    for [x, side] in ((dist[:half], profiles[:,:half]), 
+                      (dist[half:], profiles[:,half:])):
+        [x_sorted, y_sorted] = _sortProfiles(x, side)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            crossings.append([_sortedCrossing(x_sorted, y_sorted, level*cax)
+                              for level in (0.2, 0.5, 0.8)])
+    [[left20, left50, left80], [right20, right50, right80]] = crossings
+    fieldSize = right50 - left50
+    
+    #central 80% of the field, empty if the field size is unknown
+    with numpy.errstate(invalid='ignore'):
+        region = (numpy.abs(dist) <= 0.4*fieldSize[:,numpy.newaxis])
+    inRegion = region.any(axis=1)
+    highest = numpy.where(region, profiles, -numpy.inf).max(axis=1)
+    lowest = numpy.where(region, profiles, numpy.inf).min(axis=1)
+    [lo, hi, weight] = _interpolationWeights(dist, -dist)
+    mirrored = profiles[:,lo]*(1 - weight) + profiles[:,hi]*weight
+    difference = numpy.where(region, numpy.abs(profiles - mirrored), 
+                             -numpy.inf).max(axis=1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        flatness = numpy.where(inRegion, 
+                   100*(highest - lowest)/(highest + lowest), numpy.nan)
+        symmetry = numpy.where(inRegion, 100*difference/cax, numpy.nan)
+    
+    metrics = numpy.column_stack([flatness, symmetry, left50, right50,
+                                  fieldSize, left80 - left20,
+                                  right20 - right80])
+    if numpy.ndim(profilesIn) == 1:
+        return metrics[0]
+    return metrics
+
+#Metrics of (frames x detectors) AB and GT data, see FRAME_METRIC_KEYS.
+#ABdist and GTdist are the detector positions (load_profilerFile).
+@_instrumented('frameMetrics')
+def frameMetrics(AB_Frames, GT_Frames, ABdist, GTdist):
+    if _recorders.get():
+        _record('frameMetrics', frames=len(AB_Frames))
+    return numpy.column_stack([profileMetrics(ABdist, AB_Frames),
+                               profileMetrics(GTdist, GT_Frames)])
+
+#Metrics of a static export computed from its detector data (not CAX
+#corrected), see FRAME_METRIC_KEYS
+def staticMetrics(fname):
+    measurement = _asMeasurement(fname, caxCorrect=False)
+    return frameMetrics([measurement.ABdata], [measurement.GTdata],
+                        measurement.ABdist, measurement.GTdist)[0]
+
+#Metrics of every frame of a profiler 'movie'. A movie has no detector
+#positions, they are read from positionsfile (eg the reference). Returns
+#the frame numbers, their bipolar angles and the (frames x metrics)
+#array, see FRAME_METRIC_KEYS.
+def arcMetrics(filename, positionsfile, particletype):
+    config = getBeamConfig(particletype)
+    positions = positionsfile
+    if not isinstance(positions, ProfilerMeasurement):
+        positions = _asReference(positionsfile, caxCorrect=False)
+    frameNums = []
+    metrics = [numpy.zeros((0, len(FRAME_METRIC_KEYS)))]
+    for [blockFrames, frameHeader, AB_Frames, GT_Frames] in iterArcFrames(
+                                                                 filename):
+        frameNums.append(blockFrames)
+        metrics.append(frameMetrics(AB_Frames, GT_Frames, positions.ABdist,
+                                    positions.GTdist))
+    frameNums = numpy.concatenate(frameNums or [numpy.zeros(0, dtype=int)])
+    numFrames = frameNums[-1] if len(frameNums) else 1
+    angles = ((config.stopAngle-config.startAngle)*frameNums/
+              float(numFrames) - config.stopAngle)
+    return frameNums, angles, numpy.concatenate(metrics)
+
+#Returns the AB and GT detector index windows (start, stop) used to
+#compute the errors within +-10 cm of central axis
+def analysisWindow(particletype):
+    config = getBeamConfig(particletype)
+    return config.ABwindow + config.GTwindow
+
+#Computes average and maximum errors within +-10 cm of 
+#central axis in AB and GT directions
+@_instrumented('computeError')
+def computeError(ABdata,GTdata, AB_refData, GT_refData,particletype):
+    ABpoints = 0
+    GTpoints = 0
+    
+    ABdiffsum = 0
+    GTdiffsum = 0
+    
+    ABmax = 0
+    GTmax = 0
+    
+    [ABstart, ABstop, GTstart, GTstop] = analysisWindow(particletype)
+    
+    for datapos in range(int(ABstart),int(ABstop)):
+        ABdifference = 100*abs(float(
+        ABdata[datapos]) - float(
+        AB_refData[datapos]))/float(AB_refData[datapos])
+        ABdiffsum += ABdifference
+        
+        
+        if _exceedsMaximum(ABdifference, ABmax):
+            ABmax = ABdifference
+        ABpoints+=1
+        
+    
+    for datapos in range(int(GTstart),int(GTstop)):
+        GTdifference = 100*abs(float(GTdata[datapos]) - float(
+        GT_refData[datapos]))/float(GT_refData[datapos])
+        GTdiffsum += GTdifference
+        
+        if _exceedsMaximum(GTdifference, GTmax):
+            GTmax = GTdifference
+        
+        GTpoints+=1
+        
+    averageABError = ABdiffsum/ABpoints
+    averageGTError = GTdiffsum/GTpoints
+    return averageABError, averageGTError, ABmax, GTmax
+
+#Same as computeError, but for a whole block of frames at once.
+#ABframes and GTframes are (frames x detectors) arrays, returns one
+#array per quantity with one value per frame
+@_instrumented('computeErrorBatch')
+def computeErrorBatch(ABframes, GTframes, AB_refData, GT_refData,
+                      particletype):
+    if _recorders.get():
+        _record('computeErrorBatch', frames=len(ABframes))
+    errors = computeErrorMulti(ABframes, GTframes, [AB_refData], [GT_refData],
+                               particletype)
+    return [error[0] for error in errors]
+
+#Same as computeErrorBatch against N references at once. AB_refs and
+#GT_refs are (N x detectors) arrays, returns one (N x frames) array per
+#quantity
+def computeErrorMulti(ABframes, GTframes, AB_refs, GT_refs, particletype):
+    config = getBeamConfig(particletype)
+    AB_ref = numpy.asarray(AB_refs, dtype=float)[:,numpy.newaxis,
+                                                 config.ABslice]
+    GT_ref = numpy.asarray(GT_refs, dtype=float)[:,numpy.newaxis,
+                                                 config.GTslice]
+    
+    #(N x frames x detectors) deviations
+    ABdifference = 100*numpy.abs(
+    numpy.asarray(ABframes, dtype=float)[:,config.ABslice] - AB_ref)/AB_ref
+    GTdifference = 100*numpy.abs(
+    numpy.asarray(GTframes, dtype=float)[:,config.GTslice] - GT_ref)/GT_ref
+    
+    averageABErrors = ABdifference.mean(axis=2)
+    averageGTErrors = GTdifference.mean(axis=2)
+    ABmaxs = ABdifference.max(axis=2)
+    GTmaxs = GTdifference.max(axis=2)
+    return averageABErrors, averageGTErrors, ABmaxs, GTmaxs
+
+
+@_memoized
+@_instrumented('analyzeStatic')
+def analyzeStatic(fname, ref_file,particletype):
+    config = getBeamConfig(particletype)
+    #Load the reference file and file to be analyzed 
+    [AB_refDist, AB_refData, GT_refDist, GT_refData,
+        ABflatness_ref, ABsymmetry_ref, GTflatness_ref,
+            GTsymmetry_ref] = _asReference(ref_file, config.caxCorrect)
+    
+    [ABdist, ABdata, GTdist, GTdata, ABflatness,
+        ABsymmetry, GTflatness, GTsymmetry] = _asMeasurement(
+                                             fname, config.caxCorrect)
+    
+    
+    
+    #Calculate AB and GT Error for central 20 cm of the field.
+    
+    [averageABError, averageGTError, ABmax, GTmax] = computeError(
+                              ABdata,GTdata, AB_refData,GT_refData
+                              ,config)
+    
+    static_return = [ABsymmetry, ABflatness, GTsymmetry,
+    GTflatness, ABmax, GTmax, averageABError, averageGTError]
+    
+    return static_return
+
+#### Gamma index ####
+# Dose difference / distance to agreement comparison, much less sensitive
+# to small CAX shifts than the point by point errors. The reference is
+# the linear interpolation of its detector values, so the gamma of a
+# point is its smallest (scaled) distance to the segments joining them,
+# found exactly by projecting the point on the few segments within the
+# search radius. All the points of all the frames are projected at once
+# (broadcasting).
+
+#segments further than this many distance criteria are not searched,
+#larger gammas are reported as the smallest gamma found in the window
+GAMMA_SEARCH_RADIUS = 3
+
+#1D gamma index of the points of one profile (or of a (frames x points)
+#block of profiles) at positions dist against the reference profile
+#refData at positions refDist (increasing). doseCriterion is in % of the
+#reference maximum (global), distanceCriterion in the unit of the
+#positions (cm). Returns the gammas, shaped like profiles.
+def gammaIndex(dist, profiles, refDist, refData, doseCriterion=3.0,
+               distanceCriterion=0.3):
+    dist = numpy.asarray(dist, dtype=float)
+    profiles = numpy.asarray(profiles, dtype=float)
+    doseTolerance = doseCriterion*numpy.max(refData)/100.0
+    #reference in units of the criteria
+    refX = numpy.asarray(refDist, dtype=float)/distanceCriterion
+    refY = numpy.asarray(refData, dtype=float)/doseTolerance
+    x = dist/distanceCriterion
+    y = profiles/doseTolerance
+    
+    #(points x window) indices of the segments around each point
+    numSegments = len(refX) - 1
+    halfWindow = int(numpy.ceil(GAMMA_SEARCH_RADIUS/
+                                numpy.diff(refX).min())) + 1
+    segments = numpy.clip(numpy.searchsorted(refX, x)[:,numpy.newaxis] + 
+                          numpy.arange(-halfWindow, halfWindow), 
+                          0, numSegments-1)
+    x0 = refX[segments]
+    y0 = refY[segments]
+    dx = refX[segments+1] - x0
+    dy = refY[segments+1] - y0
+    
+    #projection of each point on each segment, clamped to the segment
+    px = x[:,numpy.newaxis] - x0
+    py = y[...,numpy.newaxis] - y0
+    t = numpy.clip((px*dx + py*dy)/(dx*dx + dy*dy), 0, 1)
+    return numpy.sqrt(((px - t*dx)**2 + (py - t*dy)**2).min(axis=-1))
+
+#Gamma statistics of a block of frames inside the analysis windows:
+#ABframes and GTframes are (frames x detectors) arrays and reference a
+#ProfilerMeasurement. Returns per frame arrays of the AB and GT pass
+#rates (% of points with gamma <= 1), mean gammas and maximum gammas.
+@_instrumented('computeGammaBatch')
+def computeGammaBatch(ABframes, GTframes, reference, particletype):
+    config = getBeamConfig(particletype)
+    statistics = []
+    for [frames, dist, refData, window] in (
+        (ABframes, reference.ABdist, reference.ABdata, config.ABslice),
+        (GTframes, reference.GTdist, reference.GTdata, config.GTslice)):
+        gamma = gammaIndex(dist[window], 
+                           numpy.asarray(frames, dtype=float)[:,window],
+                           dist, refData, config.gammaDose,
+                           config.gammaDistance)
+        statistics.append([100.0*(gamma <= 1).mean(axis=1),
+                           gamma.mean(axis=1), gamma.max(axis=1)])
+    [[ABpass, ABmean, ABmax], [GTpass, GTmean, GTmax]] = statistics
+    return ABpass, GTpass, ABmean, GTmean, ABmax, GTmax
+
+#Same as analyzeStatic with the gamma index instead of the point by
+#point errors. Returns the AB and GT pass rates, mean gammas and maximum
+#gammas.
+@_memoized
+@_instrumented('analyzeStaticGamma')
+def analyzeStaticGamma(fname, ref_file, particletype):
+    config = getBeamConfig(particletype)
+    reference = _asReference(ref_file, config.caxCorrect)
+    measurement = _asMeasurement(fname, config.caxCorrect)
+    
+    [ABpass, GTpass, ABmean, GTmean, ABmax, GTmax] = computeGammaBatch(
+    [measurement.ABdata], [measurement.GTdata], reference, config)
+    return [ABpass[0], GTpass[0], ABmean[0], GTmean[0], ABmax[0], GTmax[0]]
+
+#Analyzes an arc with both the point by point errors and the gamma
+#index in a single pass. The gamma index is computed for the frames used
+#in the averages of analyzeArc. Returns the ArcAccumulator, the numbers
+#of these frames and their (frames x 6) computeGammaBatch statistics.
+@_instrumented('analyzeArcGamma')
+def arcGammaAccumulator(filename, referencefilename, particletype):
+    config = getBeamConfig(particletype)
+    reference = _asReference(referencefilename, config.caxCorrect)
+    
+    accumulator = ArcAccumulator(config)
+    gammaFrames = [numpy.zeros(0, dtype=int)]
+    gammaStatistics = [numpy.zeros((0, 6))]
+    for [frameNums, frameHeader, AB_Frames, GT_Frames] in iterArcFrames(
+                                                                 filename):
+        errors = computeErrorBatch(AB_Frames, GT_Frames, reference.ABdata,
+                                   reference.GTdata, config)
+        accepted = accumulator.update(frameNums, *errors)
+        if accepted.any():
+            gammaFrames.append(frameNums[accepted])
+            gammaStatistics.append(numpy.column_stack(computeGammaBatch(
+            AB_Frames[accepted], GT_Frames[accepted], reference, config)))
+    
+    if _recorders.get():
+        _record('analyzeArcGamma', frames=accumulator.numFrames)
+    return (accumulator, numpy.concatenate(gammaFrames),
+            numpy.concatenate(gammaStatistics))
+
+#Summarizes arcGammaAccumulator: returns the average AB and GT pass
+#rates over the frames, and the lowest AB and GT pass rates with the
+#angle of their frame
+def arcGammaResults(accumulator, gammaFrames, gammaStatistics):
+    if len(gammaFrames) == 0:
+        return [numpy.nan]*6
+    results = []
+    for column in (0, 1):
+        lowest = numpy.argmin(gammaStatistics[:,column])
+        results.append(gammaStatistics[:,column].mean())
+        results += [gammaStatistics[lowest,column],
+                    accumulator.frameAngles(gammaFrames[lowest])]
+    [ABpass, ABpass_min, angleABpass_min, GTpass, GTpass_min,
+     angleGTpass_min] = results
+    return [ABpass, GTpass, ABpass_min, angleABpass_min, GTpass_min,
+            angleGTpass_min]
+
+#Same as analyzeArc with the gamma index, see arcGammaResults
+@_memoized
+def analyzeArcGamma(filename, referencefilename, particletype):
+    return arcGammaResults(*arcGammaAccumulator(filename, referencefilename,
+                                                particletype))
+
+#### Comparison to several references ####
+#ref_files is either a {name: reference file} dictionary or a list of
+#reference files, named after their file name without extension.
+#References sharing a file name are named after as many of their parent
+#directories as it takes to tell them apart (eg 'data/ref' and
+#'old/ref'), references that only differ by their extension raise
+#ValueError.
+#ProfilerMeasurements may be given instead of reference files.
+#The measurement is read once and compared to every reference at once.
+def _namedReferences(ref_files):
+    if isinstance(ref_files, dict):
+        return list(ref_files.items())
+    paths = []
+    for [i, ref_file] in enumerate(ref_files):
+        filename = ref_file
+        if isinstance(ref_file, ProfilerMeasurement):
+            filename = ref_file.filename or 'reference%d' % (i+1)
+        path = os.path.splitext(os.path.abspath(filename))[0]
+        if path in [os.sep.join(parts) for parts in paths]:
+            raise ValueError('Several references are named %s' % path)
+        paths.append(path.split(os.sep))
+    
+    depths = [1]*len(paths)
+    while True:
+        names = ['/'.join(path[-depth:]) 
+                 for [path, depth] in zip(paths, depths)]
+        counts = collections.Counter(names)
+        duplicates = [i for [i, name] in enumerate(names) if counts[name] > 1]
+        if not duplicates:
+            return list(zip(names, ref_files))
+        for i in duplicates:
+            depths[i] = min(depths[i] + 1, len(paths[i]))
+
+#returns the names and the stacked (N x detectors) AB and GT data
+def _stackReferences(ref_files, config):
+    names = []
+    AB_refs = []
+    GT_refs = []
+    for [name, ref_file] in _namedReferences(ref_files):
+        reference = _asReference(ref_file, config.caxCorrect)
+        names.append(name)
+        AB_refs.append(reference.ABdata)
+        GT_refs.append(reference.GTdata)
+    return names, numpy.array(AB_refs), numpy.array(GT_refs)
+
+#Same as analyzeStatic against several references,
+#returns {reference name: analyzeStatic results}
+def analyzeStaticMulti(fname, ref_files, particletype):
+    config = getBeamConfig(particletype)
+    [names, AB_refs, GT_refs] = _stackReferences(ref_files, config)
+    [ABdist, ABdata, GTdist, GTdata, ABflatness,
+        ABsymmetry, GTflatness, GTsymmetry] = _asMeasurement(
+                                             fname, config.caxCorrect)
+    
+    [averageABErrors, averageGTErrors, ABmaxs, GTmaxs] = computeErrorMulti(
+    [ABdata], [GTdata], AB_refs, GT_refs, config)
+    
+    results = collections.OrderedDict()
+    for [i, name] in enumerate(names):
+        results[name] = [ABsymmetry, ABflatness, GTsymmetry, GTflatness,
+                         ABmaxs[i,0], GTmaxs[i,0], averageABErrors[i,0],
+                         averageGTErrors[i,0]]
+    return results
+
+#Same as analyzeArc against several references,
+#returns {reference name: analyzeArc results}
+def analyzeArcMulti(filename, ref_files, particletype):
+    config = getBeamConfig(particletype)
+    [names, AB_refs, GT_refs] = _stackReferences(ref_files, config)
+    accumulators = [ArcAccumulator(config) for name in names]
+    
+    for [frameNums, frameHeader, AB_Frames, GT_Frames] in iterArcFrames(
+                                                                 filename):
+        [averageABErrors, averageGTErrors, ABmaxs, GTmaxs] = computeErrorMulti(
+        AB_Frames, GT_Frames, AB_refs, GT_refs, config)
+        for [i, accumulator] in enumerate(accumulators):
+            accumulator.update(frameNums, averageABErrors[i],
+                               averageGTErrors[i], ABmaxs[i], GTmaxs[i])
+    
+    return collections.OrderedDict(
+           (name, accumulator.results())
+           for [name, accumulator] in zip(names, accumulators))
+    
+
+#### Results and batch analysis ####
+#QATrack result names of the values returned by analyzeStatic and analyzeArc
+STATIC_RESULT_KEYS = ['symAB', 'homAB', 'symGT', 'homGT', 'maxAB', 'maxGT',
+                      'meanAB', 'meanGT']
+ARC_RESULT_KEYS = ['overallAvgAB', 'overallAvgGT', 'overallAB_avg_maximum',
+                   'angleABavg_max', 'overallGT_avg_maximum',
+                   'angleGTavg_max', 'numSkippedFrames']
+#QATrack result names of the values returned by analyzeStaticGamma and
+#analyzeArcGamma
+STATIC_GAMMA_RESULT_KEYS = ['gammaPassAB', 'gammaPassGT', 'gammaMeanAB',
+                            'gammaMeanGT', 'gammaMaxAB', 'gammaMaxGT']
+ARC_GAMMA_RESULT_KEYS = ['gammaPassAB', 'gammaPassGT', 'gammaPassAB_min',
+                         'angleABgammaPass_min', 'gammaPassGT_min',
+                         'angleGTgammaPass_min']
+#QATrack result names of the columns of ArcAccumulator.angleBinResults
+ANGLE_BIN_RESULT_KEYS = ['averageABError', 'averageGTError', 'ABmax',
+                         'GTmax']
+#Names of the columns of ArcAccumulator.frameResults
+FRAME_RESULT_KEYS = ['frame'] + ANGLE_BIN_RESULT_KEYS
+
+#QATrack result names of the per angle results, eg 'ABmax_neg90'
+def angleBinKeys(angleBins):
+    keys = []
+    for angle in angleBins:
+        label = ('neg%g' % -angle) if angle < 0 else ('%g' % angle)
+        keys.extend('%s_%s' % (key, label) for key in ANGLE_BIN_RESULT_KEYS)
+    return keys
+
+#True if the file is a profiler 'movie' rather than a static export
+def isArcMovie(filename):
+    if isinstance(filename, (ProfilerMeasurement, ArcMovie)):
+        return isinstance(filename, ArcMovie)
+    with open(filename,"rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        profiler_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return profiler_data.find(b'Frames:') != -1
+    finally:
+        profiler_data.close()
+
+#Analyzes one file and returns the results in a dictionary using the
+#QATrack result names. mode is 'static', 'arc' or 'auto' (arc if the
+#file is a movie). With timings=True the per stage timings are added to
+#the results under 'timings'. With gamma=True the gamma index results
+#are added as well.
+def analyzeFile(filename, ref_file, particletype, mode='auto',
+                timings=False, gamma=False):
+    if timings:
+        with instrumentation() as recorder:
+            results = analyzeFile(filename, ref_file, particletype, mode,
+                                  gamma=gamma)
+        results['timings'] = recorder.summary()
+        return results
+    
+    return analyzeFileFrames(filename, ref_file, particletype, mode,
+                             gamma)[0]
+
+#Same as analyzeFile (without timings), but also returns the per frame
+#results of arcs (see ArcAccumulator.frameResults), None for static
+#exports
+@_memoized
+def analyzeFileFrames(filename, ref_file, particletype, mode='auto',
+                      gamma=False):
+    if mode == 'auto':
+        mode = 'arc' if isArcMovie(filename) else 'static'
+    
+    frames = None
+    if mode == 'static':
+        keys = STATIC_RESULT_KEYS
+        values = analyzeStatic(filename, ref_file, particletype)
+        if gamma:
+            keys = keys + STATIC_GAMMA_RESULT_KEYS
+            values = values + analyzeStaticGamma(filename, ref_file,
+                                                 particletype)
+    elif mode == 'arc':
+        config = getBeamConfig(particletype)
+        keys = ARC_RESULT_KEYS + angleBinKeys(config.angleBins)
+        if gamma:
+            arcGamma = arcGammaAccumulator(filename, ref_file, config)
+            accumulator = arcGamma[0]
+            keys = keys + ARC_GAMMA_RESULT_KEYS
+        else:
+            accumulator = arcAccumulator(filename, ref_file, config)
+        values = (list(accumulator.results()) + 
+                  list(accumulator.angleBinResults().ravel()))
+        if gamma:
+            values += arcGammaResults(*arcGamma)
+        frames = accumulator.frameResults()
+    else:
+        raise ValueError("mode must be 'static', 'arc' or 'auto', not %r"
+                         % (mode,))
+    
+    return resultsDict(keys, values), frames
+
+#Pairs analysis results with their QATrack names, as plain python values
+def resultsDict(keys, values):
+    results = dict()
+    for [key, value] in zip(keys, values):
+        if isinstance(value, numpy.generic):
+            value = value.item()
+        if value != value: #NaN, eg an empty angle bin
+            value = None
+        results[key] = value
+    return results
+
+#Expands the directories (every .txt file in them) and glob patterns
+#given on the command line into a sorted list of files
+def findProfilerFiles(paths):
+    filenames = set()
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.update(glob.glob(os.path.join(path, '*.txt')))
+        else:
+            filenames.update(f for f in glob.glob(path) if os.path.isfile(f))
+    return sorted(filenames)
+
+#Returns the reference of the first (pattern, ref_file) pair whose
+#pattern matches the file name, or None
+def matchReference(filename, referenceMap):
+    for [pattern, ref_file] in referenceMap:
+        if fnmatch.fnmatch(os.path.basename(filename), pattern):
+            return ref_file
+    return None
+
+#runs in the worker processes, errors are reported per file. prefetched,
+#if given, is the future of loadProfilerBuffer (or _sidecarSource) for
+#the file.
+def _analyzeJob(job, prefetched=None):
+    [filename, ref_file, particletype, mode, timings, gamma,
+     writeSidecars] = job
+    results = collections.OrderedDict([('file', filename),
+                                       ('reference', ref_file)])
+    try:
+        if ref_file is None:
+            raise ValueError('No reference matches this file')
+        if prefetched is not None:
+            source = prefetched.result()
+        elif writeSidecars:
+            source = _sidecarSource(filename)
+        else:
+            source = filename
+        results.update(sorted(analyzeFile(source, ref_file, particletype,
+                                          mode, timings, gamma).items()))
+    except Exception as error:
+        results['error'] = '%s: %s' % (type(error).__name__, error)
+    return results
+
+#Writes the sidecar of a file that has no up to date one, so that this
+#and the next analyses of the file read the sidecar. Returns the file
+#name. A sidecar that cannot be written (eg. read-only archive) only
+#costs the parsing of the text.
+def _sidecarSource(filename, mode='auto'):
+    sidecar = _openSidecar(filename)
+    if sidecar is not None:
+        sidecar.close()
+        return filename
+    try:
+        convertProfilerFile(filename)
+    except (IOError, OSError):
+        pass
+    return filename
+
+#Analyzes many files, with a pool of 'jobs' processes when jobs > 1.
+#Yields one results dictionary per file in the order of filenames.
+#With a single job, the next 'prefetch' files are read by background
+#threads while a file is analyzed (the processes of jobs > 1 already
+#overlap their reads). With writeSidecars=True the sidecar of every file
+#without an up to date one is written before its analysis (see
+#convertProfilerFile), so that re-analyses of an archive skip parsing.
+def analyzeBatch(filenames, referenceMap, particletype, mode='auto', jobs=1,
+                 timings=False, prefetch=0, gamma=False, writeSidecars=False):
+    work = [(filename, matchReference(filename, referenceMap), particletype,
+             mode, timings, gamma, writeSidecars) for filename in filenames]
+    if jobs <= 1 and prefetch > 0:
+        for [job, prefetched] in _prefetchJobs(work, prefetch):
+            yield _analyzeJob(job, prefetched)
+        return
+    if jobs <= 1:
+        for job in work:
+            yield _analyzeJob(job)
+        return
+    
+    #the workers may not inherit the settings of this process (spawn and
+    #forkserver start methods, eg. on Windows and macOS)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs,
+         initializer=_initBatchWorker, initargs=(RESULT_CACHE_DIR,)) as pool:
+        chunksize = max(1, len(work) // (4*jobs))
+        for results in pool.map(_analyzeJob, work, chunksize=chunksize):
+            yield results
+
+#Settings of the worker processes of analyzeBatch
+def _initBatchWorker(resultCacheDir):
+    global RESULT_CACHE_DIR
+    RESULT_CACHE_DIR = resultCacheDir
+
+#Yields the jobs with the future of their loadProfilerBuffer (or
+#_sidecarSource if the job writes sidecars), keeping 'prefetch' files
+#read ahead of the one being analyzed
+def _prefetchJobs(work, prefetch):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=prefetch) as pool:
+        pending = collections.deque()
+        for job in work:
+            load = _sidecarSource if job[6] else loadProfilerBuffer
+            if job[1] is None:
+                pending.append((job, None)) #no reference, nothing to read
+            else:
+                pending.append((job, pool.submit(load, job[0], job[3])))
+            if len(pending) > prefetch:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+#Writes the batch results as CSV or JSON lines, as they come in
+def writeResults(resultsIter, output, outputFormat='csv'):
+    if outputFormat == 'jsonl':
+        for results in resultsIter:
+            output.write(json.dumps(results) + '\n')
+            output.flush()
+        return
+    
+    fieldnames = (['file', 'reference'] + STATIC_RESULT_KEYS + 
+                  ARC_RESULT_KEYS + angleBinKeys(PHOTON.angleBins) +
+                  STATIC_GAMMA_RESULT_KEYS + ARC_GAMMA_RESULT_KEYS[2:] +
+                  ['error'])
+    writer = csv.DictWriter(output, fieldnames, restval='',
+                            extrasaction='ignore')
+    writer.writeheader()
+    for results in resultsIter:
+        writer.writerow(results)
+        output.flush()
+
+#Command line entry point, see --help
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze profiler static '
+             'exports and movies against reference files.')
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+                        help='profiler file, directory or glob pattern')
+    parser.add_argument('-r', '--ref', action='append', required=True,
+                        metavar='[PATTERN=]REFFILE',
+                        help='reference for the files whose name matches '
+                        'PATTERN (default: every file). Can be repeated, '
+                        'the first matching pattern wins.')
+    parser.add_argument('-p', '--particle', default='PHOTON',
+                        type=str.upper, choices=sorted(BEAM_CONFIGS),
+                        help='beam configuration (default: PHOTON)')
+    parser.add_argument('-m', '--mode', default='auto',
+                        choices=['auto', 'static', 'arc'])
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (0: one per core)')
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='with a single job, files read ahead by '
+                        'background threads (default: 2, 0 to disable)')
+    parser.add_argument('-o', '--output', default='-',
+                        help='output file (default: standard output)')
+    parser.add_argument('-f', '--format', default='csv',
+                        choices=['csv', 'jsonl'])
+    parser.add_argument('--gamma', action='store_true',
+                        help='add the gamma index results (criteria of the '
+                        'beam configuration, 3%%/3 mm by default)')
+    parser.add_argument('--result-cache', metavar='DIR',
+                        help='reuse the results of files analyzed before '
+                        'with the same reference and settings, kept in DIR')
+    parser.add_argument('--timings', action='store_true',
+                        help='add the per stage timings to the JSON lines '
+                        'results')
+    parser.add_argument('--write-sidecars', action='store_true',
+                        help='write the .npz sidecar of every file without '
+                        'an up to date one, later runs read the sidecars '
+                        'instead of parsing the text')
+    parser.add_argument('--follow', action='store_true',
+                        help='follow a single arc movie while it is being '
+                        'acquired and write its partial results as JSON lines')
+    parser.add_argument('--idle-timeout', type=float, default=60,
+                        help='with --follow, stop once the movie has not '
+                        'grown for this many seconds (default: 60)')
+    args = parser.parse_args(argv)
+    
+    if args.result_cache:
+        global RESULT_CACHE_DIR
+        RESULT_CACHE_DIR = args.result_cache
+    
+    referenceMap = []
+    for ref in args.ref:
+        [pattern, sep, ref_file] = ref.rpartition('=')
+        referenceMap.append((pattern if sep else '*', ref_file))
+    
+    filenames = findProfilerFiles(args.paths)
+    if not filenames:
+        parser.error('no profiler file found')
+    
+    if args.follow:
+        if len(filenames) != 1:
+            parser.error('--follow takes a single file')
+        ref_file = matchReference(filenames[0], referenceMap)
+        if ref_file is None:
+            parser.error('no reference matches %s' % filenames[0])
+        output = sys.stdout if args.output == '-' else open(args.output, 'w')
+        try:
+            for values in followArc(filenames[0], ref_file, args.particle,
+                                    idleTimeout=args.idle_timeout):
+                output.write(json.dumps(resultsDict(ARC_RESULT_KEYS, values))
+                             + '\n')
+                output.flush()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        return 0
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    
+    resultsIter = analyzeBatch(filenames, referenceMap, args.particle,
+                               args.mode, jobs, args.timings, args.prefetch,
+                               args.gamma, args.write_sidecars)
+    if args.output == '-':
+        writeResults(resultsIter, sys.stdout, args.format)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            writeResults(resultsIter, output, args.format)
+    return 0
+
+
+#Create a python dictionary with the results from the analysis
+#function to populate qatrack results.
+profiler_results = dict()
+
+#### QATrack integration begins here ####
+    
+#To avoid importing NumPy and parsing the reference on every test, run
+# profilerDaemon.py on the QATrack server and paste profilerClient.py
+# in the composite test calculation instead of this file.
+
+#To test QA track implementation use this in the file upload
+# composite test calculation box. Just uncomment the necessary lines
+
+
+#For static
+# profiler_results['symAB'] = float(100)
+# profiler_results['homAB'] = float(101)
+# profiler_results['symGT'] = float(102)
+# profiler_results['homGT'] = float(103)
+# profiler_results['maxAB'] = float(104)
+# profiler_results['maxGT'] = float(105)
+# profiler_results['meanAB'] = float(106)
+# profiler_results['meanGT'] = float(107)
+# result = profiler_results
+
+#For Arc
+# profiler_results['overallAvgAB'] =1
+# profiler_results['overallAvgGT'] =2
+# profiler_results['overallABmaximum'] =3
+# profiler_results['overallGTmaximum'] =4
+# profiler_results['averageABError_neg180']=5
+# profiler_results['averageGTError_neg180']=6
+# profiler_results['ABmax_neg180']=7
+# profiler_results['GTmax_neg180']=8
+# profiler_results['averageABError_neg90']=9
+# profiler_results['averageGTError_neg90']=10
+# profiler_results['ABmax_neg90']=11
+# profiler_results['GTmax_neg90']=12
+# profiler_results['averageABError_0']=13
+# profiler_results['averageGTError_0']=14
+# profiler_results['ABmax_0']=15
+# profiler_results['GTmax_0']=16
+# profiler_results['averageABError_90']=17
+# profiler_results['averageGTError_90']=18
+# profiler_results['ABmax_90']=19
+# profiler_results['GTmax_90']=20
+# profiler_results['averageABError_180']=21
+# profiler_results['averageGTError_180']=22
+# profiler_results['ABmax_180']=23
+# profiler_results['GTmax_180']=24
+
+#The various tests must have this in their composite test
+# calculation procedure so that the results populate.
+#eg for 6 MV:
+    #result = profiler_stat_6mv['symAB']
+    #result = profiler_stat_6mv['meanAB']
+    #result = profiler_stat_6mv['meanGT']
+    #result = profiler_stat_6mv['maxAB']
+    #result = profiler_stat_6mv['symGT']
+    #result = profiler_stat_6mv['homAB']
+    #result = profiler_stat_6mv['homGT']
+    #result = profiler_stat_6mv['maxGT']        
+
+
+
+#Define reference file
+
+ref_path = ('/chum/dsp/Radio-oncologie/commun/Physique radio-onco/'
+            'QAtrack/References/Profiler/')
+
+#uncomment to keep the parsed references in a cache next to them:
+#REFERENCE_CACHE_DIR = ref_path + 'cache/'
+
+#uncomment to reuse the results when an upload is analyzed again:
+#RESULT_CACHE_DIR = ref_path + 'results/'
+
+
+ref_file = None
+#ref_file = ref_path + 'VERSA_ref6MV.txt'
+#ref_file = ref_path + 'VERSA_ref10MV.txt'
+#ref_file = ref_path + 'VERSA_ref18MV.txt'
+#ref_file = ref_path + 'VERSA_ref6FFF.txt'
+#ref_file = ref_path + 'VERSA_ref10FFF.txt'
+#ref_file = ref_path + 'VERSA_ref6MEV.txt'
+#ref_file = ref_path + 'VERSA_ref9MEV.txt'
+#ref_file = ref_path + 'VERSA_ref12MEV.txt'
+#ref_file = ref_path + 'VERSA_ref15MEV.txt'
+
+#ref_file = ref_path + 'EDGE_ref6MV.txt'
+#ref_file = ref_path + 'EDGE_ref6FFF.txt'
+#ref_file = ref_path + 'EDGE_ref10FFF.txt'
+#ref_file = ref_path + 'EDGE_ref25FFF.txt'
+
+#ref_file = ref_path + 'SALLEG_VARIAN_ref6MV.txt'
+
+
+#uncomment the analysis that you wish to perform:
+analysis = None
+
+#For static analysis of photon beams:
+#analysis = ('static', 'PHOTON')
+ 
+#For static analysis of electron beams:
+#analysis = ('static', 'ELECTRON')
+
+#For arc analysis of photon beams:
+#analysis = ('arc', 'PHOTON')
+
+#For arc analysis of electron beams:
+#analysis = ('arc', 'ELECTRON')
+
+#The settings of the former profilerAnalysis_photons.py and
+#profilerAnalysis_electrons.py scripts (no CAX correction, and every
+#frame analyzed for electron arcs) are available as PHOTON_LEGACY and
+#ELECTRON_LEGACY, eg:
+#analysis = ('arc', ELECTRON_LEGACY)
+
+
+#QATrack+ entry point: analyzes the uploaded FILE with the reference and
+#analysis selected above and returns the QATrack results dictionary
+def qatrackMain(FILE):
+    # on recupere le nom du fichier a partir de l'objet FILE 
+    # qui nous est passe et on ferme le fichier pour ne pas avoir de conflit
+    filename = FILE.name
+    FILE.close()
+    
+    profiler_results = dict()
+    if ref_file is not None and analysis is not None:
+        [mode, particletype] = analysis
+        profiler_results.update(
+        analyzeFile(filename, ref_file, particletype, mode))
+    return profiler_results
+
+
+#From Danis Blais' catphan analysis program
+#Importing this file has no side effect, the analysis only runs from
+#QATrack+ (FILE is defined) or from the command line.
+if 'FILE' in vars() or 'FILE' in globals():
+    #qatrack needs this line.
+    result = qatrackMain(FILE)
+elif __name__ == '__main__':
+    # le programme a ete lance en dehors de QATrack+: analyse en lot
+    # des fichiers, repertoires ou motifs donnes en argument (voir --help)
+    sys.exit(main())
@@ -0,0 +1,200 @@
+###############################################################################
+# Benchmarks of the profilerAnalysis stages on synthetic Profiler exports.
+#
+# Writes a static export, a reference and 'movies' of the requested
+# lengths in a scratch directory, then times each stage (parsing, frame
+# extraction, bulk and per row numeric parsing, CAX correction, errors,
+# gamma index and profile metrics, whole analyses) and records its
+# throughput and peak memory. The results are saved as JSON so that
+# versions can be compared:
+#
+#   python profilerBenchmark.py --frames 100 1000 10000 -o bench.json
+###############################################################################
+import sys,os.path
+import argparse
+import json
+import platform
+import shutil
+import tempfile
+import time
+import timeit
+import tracemalloc
+import numpy
+
+import profilerAnalysis
+
+#### Synthetic Profiler exports ####
+#Detector positions (cm) of the AB (X) and GT (Y) axes
+AB_POSITIONS = numpy.arange(63)*0.5 - 15.5
+GT_POSITIONS = numpy.arange(65)*0.5 - 16.0
+
+#Normalized profile of a square field of half width 'halfWidth' (cm)
+def syntheticProfile(x, halfWidth=10.0, penumbra=0.6, shift=0.0):
+    return 100.0/(1 + numpy.exp((numpy.abs(x - shift) - halfWidth)/penumbra))
+
+#Profiler exports use decimal commas
+def _number(value):
+    return ('%.3f' % value).replace('.', ',')
+
+#Writes a static Profiler export with the 'X/Y Axis Analysis' and
+#'Detector ID X/Y Axis' sections read by load_profilerFile
+def writeStaticExport(filename, shift=0.0, noise=0.3, seed=0):
+    random = numpy.random.RandomState(seed)
+    lines = ['Profiler 2 export', 'Version 1.4.0', '']
+    for axis in ('X', 'Y'):
+        lines += ['%s Axis Analysis' % axis, 'Field Size\tcm\t20,0',
+                  'Left Edge\tcm\t-10,0', 'Right Edge\tcm\t10,0',
+                  'Central Axis\tcm\t0,0', 'Penumbra Left\tcm\t0,6',
+                  'Penumbra Right\tcm\t0,6',
+                  'Flatness\tperc\t%s' % _number(random.uniform(0, 2)),
+                  'Symmetry\tperc\t%s' % _number(random.uniform(0, 1)), '']
+    for [axis, positions] in (('X', AB_POSITIONS), ('Y', GT_POSITIONS)):
+        data = (syntheticProfile(positions, shift=shift) +
+                random.randn(len(positions))*noise)
+        lines.append('Detector ID\t%s Axis' % axis)
+        lines += ['%s\t%s' % (_number(x), _number(y))
+                  for [x, y] in zip(positions, data)]
+        lines.append('')
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+#Writes a Profiler 'movie' of numFrames frames after a 'Frames:' marker.
+#A fraction spikeRate of the frames is scaled up by 10% to trigger the
+#dropped counts rejection of analyzeArc.
+def writeArcMovie(filename, numFrames, noise=0.5, spikeRate=0.02, seed=1):
+    random = numpy.random.RandomState(seed)
+    AB_profile = syntheticProfile(AB_POSITIONS)
+    GT_profile = syntheticProfile(GT_POSITIONS)
+    titles = (['Frame', 'Time', 'Pulses'] +
+              ['X%d' % i for i in range(1, 64)] +
+              ['Y%d' % i for i in range(1, 66)])
+    with open(filename, 'w') as f:
+        f.write('Profiler 2 movie\nVersion 1.4.0\n\nFrames:\n')
+        f.write('\t'.join(titles) + '\n')
+        for frame in range(1, numFrames+1):
+            scale = 1.1 if random.rand() < spikeRate else 1.0
+            AB_Frame = scale*AB_profile + random.randn(63)*noise
+            GT_Frame = scale*GT_profile + random.randn(65)*noise
+            row = ([str(frame), _number(frame*0.1), str(frame*50)] +
+                   [_number(value) for value in AB_Frame] +
+                   [_number(value) for value in GT_Frame])
+            f.write('\t'.join(row) + '\n')
+
+
+#### Benchmark ####
+#Times stage() (best of 'repeat' runs of 'number' calls) and measures its
+#peak memory in a separate traced run. 'items' is the number of frames or
+#files one call processes, used for the throughput.
+def timeStage(name, stage, items, unit, repeat=5, number=1):
+    stage() #warm up caches and imports
+    times = timeit.repeat(stage, repeat=repeat, number=number)
+    seconds = min(times)/number
+
+    tracemalloc.start()
+    try:
+        stage()
+        peakBytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'stage': name, 'seconds': seconds,
+            'throughput': items/seconds if seconds > 0 else None,
+            'unit': unit, 'items': items, 'peakMemoryBytes': peakBytes}
+
+#Runs every stage on files written to workdir, returns a list of results
+def runBenchmarks(workdir, frameCounts, repeat=5):
+    pa = profilerAnalysis
+    ref_file = os.path.join(workdir, 'reference.txt')
+    static_file = os.path.join(workdir, 'static.txt')
+    writeStaticExport(ref_file, noise=0.0, seed=0)
+    writeStaticExport(static_file, shift=0.2, seed=3)
+
+    [ABdist, ABdata, GTdist, GTdata] = pa.parseProfilerFile(static_file)[0:4]
+    [AB_refDist, AB_refData, GT_refDist, GT_refData] = (
+        pa.load_profilerFile(ref_file)[0:4])
+    reference = pa.ProfilerMeasurement.load(ref_file)
+
+    results = [
+        timeStage('load_profilerFile',
+                  lambda: pa.load_profilerFile(static_file), 1, 'files/s',
+                  repeat, 20),
+        timeStage('caxcorrect', lambda: pa.caxcorrect(ABdist, ABdata), 1,
+                  'profiles/s', repeat, 100),
+        timeStage('computeError', lambda: pa.computeError(ABdata, GTdata,
+                  AB_refData, GT_refData, 'PHOTON'), 1, 'frames/s', repeat,
+                  100),
+        timeStage('analyzeStatic',
+                  lambda: pa.analyzeStatic(static_file, ref_file, 'PHOTON'),
+                  1, 'files/s', repeat, 20),
+    ]
+
+    for numFrames in frameCounts:
+        movie = os.path.join(workdir, 'movie%d.txt' % numFrames)
+        writeArcMovie(movie, numFrames)
+        [frameHeader, AB_Frames, GT_Frames] = pa.loadArcMovie(movie)
+        lines = list(pa.iterArcLines(movie))
+        stages = [
+            #bulk numeric parse against the per row path
+            ('parseArcLines', lambda: pa.parseArcLines(lines)),
+            ('parseArcRows', lambda: pa._parseArcRows(lines)),
+            ('getNumFrames', lambda: pa.getNumFrames(movie)),
+            ('extractArcFrame', lambda: pa.extractArcFrame(movie, numFrames)),
+            ('loadArcMovie', lambda: pa.loadArcMovie(movie)),
+            ('caxcorrect', lambda: pa.caxcorrect(AB_POSITIONS, AB_Frames)),
+            ('computeErrorBatch', lambda: pa.computeErrorBatch(AB_Frames,
+             GT_Frames, AB_refData, GT_refData, 'PHOTON')),
+            ('computeGammaBatch', lambda: pa.computeGammaBatch(AB_Frames,
+             GT_Frames, reference, 'PHOTON')),
+            ('frameMetrics', lambda: pa.frameMetrics(AB_Frames, GT_Frames,
+             AB_POSITIONS, GT_POSITIONS)),
+            ('analyzeArc', lambda: pa.analyzeArc(movie, ref_file, 'PHOTON')),
+        ]
+        for [name, stage] in stages:
+            result = timeStage(name, stage, numFrames, 'frames/s', repeat)
+            result['frames'] = numFrames
+            results.append(result)
+    return results
+
+#Python, NumPy and machine details stored with the results
+def environment():
+    return {'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the '
+             'profilerAnalysis stages on synthetic Profiler exports.')
+    parser.add_argument('--frames', type=int, nargs='+',
+                        default=[100, 1000, 10000],
+                        help='movie lengths (default: 100 1000 10000)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timing runs per stage, the best is kept')
+    parser.add_argument('-o', '--output', help='JSON results file')
+    parser.add_argument('--workdir', help='directory for the synthetic '
+                        'files (default: a temporary directory)')
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='profilerBenchmark')
+    try:
+        results = runBenchmarks(workdir, args.frames, args.repeat)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir)
+
+    for result in results:
+        frames = ('%d frames' % result['frames']) if 'frames' in result else ''
+        print('%-18s %12s %12.6f s %14.1f %-11s %10.1f kB peak' % (
+              result['stage'], frames, result['seconds'],
+              result['throughput'] or 0, result['unit'],
+              result['peakMemoryBytes']/1024.0))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f,
+                      indent=1)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
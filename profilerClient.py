@@ -0,0 +1,132 @@
+###############################################################################
+# Thin QATrack+ client of profilerDaemon.py.
+#
+# Paste this file instead of profilerAnalysis.py in the composite test
+# calculation of the file upload tests. It only imports the standard
+# library and sends the uploaded file to the daemon, which keeps the
+# references parsed, so a test costs little more than the parsing of the
+# measurement. If the daemon cannot be reached, the file is analyzed
+# here with profilerAnalysis (when it can be imported).
+#
+# The reference and analysis are selected as in profilerAnalysis.py.
+###############################################################################
+import sys,os.path
+import json
+import socket
+import tempfile
+
+#Must match profilerDaemon.DEFAULT_ADDRESS
+if hasattr(socket, 'AF_UNIX'):
+    DAEMON_ADDRESS = os.path.join(tempfile.gettempdir(),
+                                  'profilerAnalysis.sock')
+else:
+    DAEMON_ADDRESS = ('127.0.0.1', 8765)
+
+#Seconds to wait for the results of one analysis
+DAEMON_TIMEOUT = 300
+
+#Sends one request to the daemon and returns its response. Raises
+#socket.error (OSError) if the daemon cannot be reached.
+def daemonRequest(request, address=None, timeout=None):
+    address = address or DAEMON_ADDRESS
+    if isinstance(address, tuple):
+        connection = socket.create_connection(address, timeout or
+                                              DAEMON_TIMEOUT)
+    else:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout or DAEMON_TIMEOUT)
+        connection.connect(address)
+    try:
+        connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        response = b''
+        while not response.endswith(b'\n'):
+            data = connection.recv(65536)
+            if not data:
+                raise socket.error('Connection closed by the daemon')
+            response += data
+    finally:
+        connection.close()
+    return json.loads(response.decode('utf-8'))
+
+#Same as profilerAnalysis.analyzeFile, run by the daemon. particletype
+#is a configuration name, eg 'PHOTON' or 'ELECTRON_LEGACY'. Analysis
+#errors are raised as ValueError.
+def analyzeRemote(filename, ref_file, particletype, mode='auto',
+                  gamma=False, address=None, timeout=None):
+    response = daemonRequest({'file': os.path.abspath(filename),
+                              'reference': os.path.abspath(ref_file),
+                              'particletype': particletype, 'mode': mode,
+                              'gamma': gamma}, address, timeout)
+    if 'error' in response:
+        raise ValueError(response['error'])
+    return response['results']
+
+#analyzeRemote, or the analysis in this process if the daemon is down
+def analyzeFile(filename, ref_file, particletype, mode='auto', gamma=False):
+    try:
+        return analyzeRemote(filename, ref_file, particletype, mode, gamma)
+    except socket.error:
+        if not LOCAL_FALLBACK:
+            raise
+    import profilerAnalysis
+    return profilerAnalysis.analyzeFile(filename, ref_file, particletype,
+                                        mode, gamma=gamma)
+
+
+#### QATrack integration begins here ####
+
+#Analyze in this process when the daemon is not running
+LOCAL_FALLBACK = True
+
+#Define reference file
+
+ref_path = ('/chum/dsp/Radio-oncologie/commun/Physique radio-onco/'
+            'QAtrack/References/Profiler/')
+
+ref_file = None
+#ref_file = ref_path + 'VERSA_ref6MV.txt'
+#ref_file = ref_path + 'VERSA_ref10MV.txt'
+#ref_file = ref_path + 'VERSA_ref18MV.txt'
+#ref_file = ref_path + 'VERSA_ref6FFF.txt'
+#ref_file = ref_path + 'VERSA_ref10FFF.txt'
+#ref_file = ref_path + 'VERSA_ref6MEV.txt'
+#ref_file = ref_path + 'VERSA_ref9MEV.txt'
+#ref_file = ref_path + 'VERSA_ref12MEV.txt'
+#ref_file = ref_path + 'VERSA_ref15MEV.txt'
+
+#ref_file = ref_path + 'EDGE_ref6MV.txt'
+#ref_file = ref_path + 'EDGE_ref6FFF.txt'
+#ref_file = ref_path + 'EDGE_ref10FFF.txt'
+#ref_file = ref_path + 'EDGE_ref25FFF.txt'
+
+#ref_file = ref_path + 'SALLEG_VARIAN_ref6MV.txt'
+
+
+#uncomment the analysis that you wish to perform, the beam
+#configuration is given by its name:
+analysis = None
+#analysis = ('static', 'PHOTON')
+#analysis = ('static', 'ELECTRON')
+#analysis = ('arc', 'PHOTON')
+#analysis = ('arc', 'ELECTRON')
+#analysis = ('arc', 'ELECTRON_LEGACY')
+
+
+#QATrack+ entry point, same results as profilerAnalysis.qatrackMain
+def qatrackMain(FILE):
+    # on recupere le nom du fichier a partir de l'objet FILE
+    # qui nous est passe et on ferme le fichier pour ne pas avoir de conflit
+    filename = FILE.name
+    FILE.close()
+
+    profiler_results = dict()
+    if ref_file is not None and analysis is not None:
+        [mode, particletype] = analysis
+        profiler_results.update(
+        analyzeFile(filename, ref_file, particletype, mode))
+    return profiler_results
+
+
+if 'FILE' in vars() or 'FILE' in globals():
+    #qatrack needs this line.
+    result = qatrackMain(FILE)
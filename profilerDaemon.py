@@ -0,0 +1,161 @@
+###############################################################################
+# Long running analysis service for QATrack+.
+#
+# A QATrack+ upload test runs its composite calculation in a fresh
+# context, which pays for the NumPy import and the parsing of the
+# reference from the network share on every test. This daemon keeps
+# profilerAnalysis imported and its reference cache warm, and analyzes
+# the files sent by profilerClient.py over a local socket:
+#
+#   python profilerDaemon.py --preload /path/to/References/Profiler
+#
+# Protocol: one JSON object per line in each direction. A request
+#   {"file": ..., "reference": ..., "particletype": "PHOTON",
+#    "mode": "auto", "timings": false, "gamma": false}
+# is answered with {"results": {...}} (the analyzeFile dictionary) or
+# {"error": "..."}. {"command": "ping"} is answered with {"pong": true}.
+###############################################################################
+import sys,os.path
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import signal
+import socket
+import tempfile
+
+import profilerAnalysis
+
+#Unix socket where it exists, localhost TCP otherwise (Windows)
+if hasattr(socket, 'AF_UNIX'):
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(),
+                                   'profilerAnalysis.sock')
+else:
+    DEFAULT_ADDRESS = ('127.0.0.1', 8765)
+
+#Returns the response to one request
+def handleRequest(request):
+    if request.get('command', 'analyze') == 'ping':
+        return {'pong': True}
+    if request.get('command', 'analyze') != 'analyze':
+        raise ValueError('Unknown command %r' % (request['command'],))
+
+    for key in ('file', 'reference'):
+        if not request.get(key):
+            raise ValueError('%r missing from the request' % key)
+    results = profilerAnalysis.analyzeFile(request['file'],
+              request['reference'], request.get('particletype', 'PHOTON'),
+              request.get('mode', 'auto'), request.get('timings', False),
+              request.get('gamma', False))
+    return {'results': results}
+
+#Serves the requests of one connection, in order. The analyses run in
+#the thread pool so that other connections are served meanwhile, and
+#share the reference cache of profilerAnalysis.
+async def _serveConnection(reader, writer, pool):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('Requests must be JSON objects')
+                response = await loop.run_in_executor(pool, handleRequest,
+                                                      request)
+            except Exception as error:
+                response = {'error': '%s: %s' % (type(error).__name__,
+                                                 error)}
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+#Parses and CAX corrects the given references so that the first
+#requests find them in the cache. Returns the number loaded.
+def preloadReferences(paths):
+    loaded = 0
+    for ref_file in profilerAnalysis.findProfilerFiles(paths):
+        try:
+            profilerAnalysis.loadReference(ref_file)
+            loaded += 1
+        except (IOError, OSError, ValueError, IndexError) as error:
+            sys.stderr.write('Cannot preload %s: %s\n' % (ref_file, error))
+    return loaded
+
+#Runs the daemon until it is interrupted. address is a unix socket path
+#or a (host, port) pair.
+async def serve(address=DEFAULT_ADDRESS, workers=2):
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    handler = lambda reader, writer: _serveConnection(reader, writer, pool)
+    if isinstance(address, tuple):
+        server = await asyncio.start_server(handler, *address)
+    else:
+        #a socket left behind by a daemon that did not exit cleanly
+        if os.path.exists(address):
+            os.remove(address)
+        server = await asyncio.start_unix_server(handler, address)
+    #stop cleanly on 'kill', removing the socket
+    if hasattr(signal, 'SIGTERM') and sys.platform != 'win32':
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                   asyncio.current_task().cancel)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        pool.shutdown(wait=False)
+        if not isinstance(address, tuple) and os.path.exists(address):
+            os.remove(address)
+
+#Command line entry point, see --help
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve profilerAnalysis '
+             'analyses to profilerClient over a local socket.')
+    parser.add_argument('--socket', default=None,
+                        help='unix socket path (default: %s)' %
+                        (DEFAULT_ADDRESS,))
+    parser.add_argument('--port', type=int, default=None,
+                        help='listen on localhost TCP port PORT instead of a '
+                        'unix socket')
+    parser.add_argument('--preload', nargs='+', default=[], metavar='PATH',
+                        help='reference files, directories or glob patterns '
+                        'to parse at startup')
+    parser.add_argument('--cache-size', type=int,
+                        default=profilerAnalysis.REFERENCE_CACHE_SIZE,
+                        help='number of references kept in memory')
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory of the on disk reference cache')
+    parser.add_argument('--result-cache-dir', default=None,
+                        help='directory of the on disk cache of the results')
+    parser.add_argument('-j', '--workers', type=int, default=2,
+                        help='analyses run at the same time (default: 2)')
+    args = parser.parse_args(argv)
+
+    if args.port is not None:
+        address = ('127.0.0.1', args.port)
+    else:
+        address = args.socket or DEFAULT_ADDRESS
+    profilerAnalysis.REFERENCE_CACHE_SIZE = args.cache_size
+    profilerAnalysis.REFERENCE_CACHE_DIR = args.cache_dir
+    profilerAnalysis.RESULT_CACHE_DIR = args.result_cache_dir
+
+    if args.preload:
+        sys.stderr.write('%d references preloaded\n' %
+                         preloadReferences(args.preload))
+    sys.stderr.write('Listening on %s\n' % (address,))
+    try:
+        asyncio.run(serve(address, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
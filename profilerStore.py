@@ -0,0 +1,290 @@
+###############################################################################
+# Local SQLite store of the analysis results, for trending.
+#
+# Every analyzed file is one session row, keyed by the hash of its
+# content, the machine (VERSA, EDGE, SALLEG, ...), the energy and the
+# acquisition date. The QATrack results go in a (session, key, value)
+# table and the per frame results of arcs in a compact blob, so a trend
+# over thousands of sessions is a single indexed query:
+#
+#   store = ResultsStore('profiler.db')
+#   store.analyze('arc.txt', 'VERSA_ref6MV.txt', 'PHOTON')
+#   [dates, values] = store.trend('overallAvgAB', machine='VERSA',
+#                                 energy='6MV', start='2017-01-01')
+#
+# or from the command line:
+#
+#   python profilerStore.py profiler.db add arcs/ -r VERSA_ref6MV.txt
+#   python profilerStore.py profiler.db trend symAB --machine VERSA
+###############################################################################
+import sys,os.path
+import argparse
+import csv
+import datetime
+import io
+import re
+import sqlite3
+import numpy
+
+import profilerAnalysis
+
+#Machine names looked for in the file paths
+MACHINES = ('VERSA', 'EDGE', 'SALLEG')
+#Machine names as whole words ('_' separates words in file names, so
+#VERSA_ref6MV.txt matches but KNOWLEDGE and UNIVERSAL do not)
+_MACHINE = re.compile(r'(?<![A-Z])(%s)(?![A-Z])' % '|'.join(MACHINES))
+#Energies in the file paths, eg '6MV', '10 FFF' or '12MeV'
+_ENERGY = re.compile(r'(\d+)\s*(MV|FFF|MEV)', re.IGNORECASE)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    energy TEXT NOT NULL,
+    date REAL NOT NULL,
+    filename TEXT,
+    reference TEXT,
+    particletype TEXT,
+    mode TEXT,
+    frames BLOB,
+    UNIQUE (hash, machine, energy, date)
+);
+CREATE INDEX IF NOT EXISTS sessions_date ON sessions (date);
+CREATE INDEX IF NOT EXISTS sessions_machine
+    ON sessions (machine, energy, date);
+CREATE TABLE IF NOT EXISTS results (
+    session INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (key, session)
+) WITHOUT ROWID;
+'''
+
+#Machine and energy found in a file path ('' if not found), the ones
+#closest to the end of the path win
+def sessionInfo(filename):
+    path = os.path.abspath(filename).upper()
+    machines = _MACHINE.findall(path)
+    energies = _ENERGY.findall(path)
+    return (machines[-1] if machines else '',
+            ''.join(energies[-1]) if energies else '')
+
+#Dates are stored as POSIX timestamps (UTC). date is a timestamp, a
+#datetime or date, a numpy.datetime64 or an ISO 8601 string.
+def _timestamp(date):
+    if isinstance(date, (str, datetime.date)):
+        date = numpy.datetime64(date)
+    if isinstance(date, numpy.datetime64):
+        return (date - numpy.datetime64('1970-01-01T00:00:00')) / (
+                numpy.timedelta64(1, 's'))
+    return float(date)
+
+#Per frame results are stored as float32 .npy data
+def _packFrames(frames):
+    if frames is None:
+        return None
+    buffer = io.BytesIO()
+    numpy.save(buffer, numpy.asarray(frames, dtype=numpy.float32))
+    return buffer.getvalue()
+
+def _unpackFrames(blob):
+    if blob is None:
+        return None
+    return numpy.load(io.BytesIO(blob))
+
+class ResultsStore(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    #Stores the results dictionary (analyzeFile) of a file and its per
+    #frame results, if any. The machine and energy default to the ones
+    #found in the file path and the date to the modification time of the
+    #file. A session with the same key is replaced. Returns the session
+    #id.
+    def add(self, filename, results, frames=None, machine=None,
+            energy=None, date=None, reference=None, particletype=None,
+            mode=None, contentHash=None):
+        [pathMachine, pathEnergy] = sessionInfo(filename)
+        machine = pathMachine if machine is None else machine
+        energy = pathEnergy if energy is None else energy
+        date = os.path.getmtime(filename) if date is None else date
+        if contentHash is None:
+            contentHash = profilerAnalysis.contentHash(filename)
+        if isinstance(particletype, profilerAnalysis.BeamConfig):
+            particletype = particletype.name
+
+        key = (contentHash, machine.upper(), energy.upper(), _timestamp(date))
+        with self.connection:
+            self.connection.execute(
+            'DELETE FROM sessions WHERE hash = ? AND machine = ? AND '
+            'energy = ? AND date = ?', key)
+            cursor = self.connection.execute(
+            'INSERT INTO sessions (hash, machine, energy, date, filename, '
+            'reference, particletype, mode, frames) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            key + (os.path.abspath(filename), reference and
+                   os.path.abspath(reference), particletype, mode,
+                   _packFrames(frames)))
+            session = cursor.lastrowid
+            #results without a numerical value (eg timings) are not kept
+            self.connection.executemany(
+            'INSERT INTO results (session, key, value) VALUES (?, ?, ?)',
+            [(session, key, value) for [key, value] in results.items()
+             if value is None or isinstance(value, (int, float))])
+        return session
+
+    #Analyzes a file (see profilerAnalysis.analyzeFile) and stores its
+    #results, returns the results dictionary. info may give the machine,
+    #energy and date (see add).
+    def analyze(self, filename, ref_file, particletype, mode='auto',
+                gamma=False, **info):
+        if mode == 'auto':
+            mode = ('arc' if profilerAnalysis.isArcMovie(filename) 
+                    else 'static')
+        [results, frames] = profilerAnalysis.analyzeFileFrames(filename,
+                            ref_file, particletype, mode, gamma)
+        self.add(filename, results, frames, reference=ref_file,
+                 particletype=particletype, mode=mode, **info)
+        return results
+
+    #Session id of a file already stored (by content), None otherwise
+    def find(self, filename=None, contentHash=None):
+        if contentHash is None:
+            contentHash = profilerAnalysis.contentHash(filename)
+        row = self.connection.execute(
+        'SELECT id FROM sessions WHERE hash = ? ORDER BY date DESC LIMIT 1',
+        (contentHash,)).fetchone()
+        return row[0] if row else None
+
+    #WHERE clause and parameters selecting sessions
+    def _where(self, machine, energy, start, stop):
+        clauses = []
+        parameters = []
+        for [clause, value] in (('s.machine = ?', machine),
+                                ('s.energy = ?', energy)):
+            if value is not None:
+                clauses.append(clause)
+                parameters.append(value.upper())
+        for [clause, value] in (('s.date >= ?', start), ('s.date < ?', stop)):
+            if value is not None:
+                clauses.append(clause)
+                parameters.append(_timestamp(value))
+        return (' AND '.join(clauses) or '1'), parameters
+
+    #Trend of a result (eg 'symAB' or 'overallAvgAB') between the dates
+    #start (included) and stop (excluded). Returns the session dates
+    #(datetime64) and values (NaN where missing) as arrays sorted by date.
+    def trend(self, key, machine=None, energy=None, start=None, stop=None):
+        [where, parameters] = self._where(machine, energy, start, stop)
+        rows = self.connection.execute(
+        'SELECT s.date, r.value FROM results r JOIN sessions s '
+        'ON s.id = r.session WHERE r.key = ? AND %s ORDER BY s.date' % where,
+        [key] + parameters).fetchall()
+        data = numpy.array(rows, dtype=float).reshape(-1, 2)
+        return _datetimes(data[:,0]), data[:,1]
+
+    #Sessions between start and stop as a list of dictionaries, sorted
+    #by date
+    def sessions(self, machine=None, energy=None, start=None, stop=None):
+        [where, parameters] = self._where(machine, energy, start, stop)
+        cursor = self.connection.execute(
+        'SELECT s.id, s.hash, s.machine, s.energy, s.date, s.filename, '
+        's.reference, s.particletype, s.mode FROM sessions s WHERE %s '
+        'ORDER BY s.date' % where, parameters)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    #Results dictionary of a session
+    def results(self, session):
+        return dict(self.connection.execute(
+               'SELECT key, value FROM results WHERE session = ?',
+               (session,)))
+
+    #Per frame results of an arc session as a (frames x 5) array (see
+    #profilerAnalysis.FRAME_RESULT_KEYS), None for static sessions
+    def frames(self, session):
+        row = self.connection.execute(
+              'SELECT frames FROM sessions WHERE id = ?',
+              (session,)).fetchone()
+        if row is None:
+            raise KeyError('No session %r' % (session,))
+        return _unpackFrames(row[0])
+
+def _datetimes(timestamps):
+    return (numpy.round(timestamps*1000).astype('int64')
+            .astype('datetime64[ms]'))
+
+#Command line entry point, see --help
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Store profilerAnalysis '
+             'results in a SQLite database and query their trends.')
+    parser.add_argument('database')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    add = commands.add_parser('add', help='analyze and store files')
+    add.add_argument('paths', nargs='+', metavar='PATH',
+                     help='profiler file, directory or glob pattern')
+    add.add_argument('-r', '--ref', action='append', required=True,
+                     metavar='[PATTERN=]REFFILE',
+                     help='reference for the files whose name matches '
+                     'PATTERN (default: every file)')
+    add.add_argument('-p', '--particle', default='PHOTON', type=str.upper,
+                     choices=sorted(profilerAnalysis.BEAM_CONFIGS))
+    add.add_argument('-m', '--mode', default='auto',
+                     choices=['auto', 'static', 'arc'])
+    add.add_argument('--gamma', action='store_true')
+    add.add_argument('--machine', help='default: found in the file path')
+    add.add_argument('--energy', help='default: found in the file path')
+
+    trend = commands.add_parser('trend', help='write the trend of a result '
+                                'as CSV')
+    trend.add_argument('key', help="result name, eg 'symAB'")
+    trend.add_argument('--machine')
+    trend.add_argument('--energy')
+    trend.add_argument('--start', help='first date (ISO 8601)')
+    trend.add_argument('--stop', help='date after the last one (ISO 8601)')
+    args = parser.parse_args(argv)
+
+    with ResultsStore(args.database) as store:
+        if args.command == 'add':
+            referenceMap = []
+            for ref in args.ref:
+                [pattern, sep, ref_file] = ref.rpartition('=')
+                referenceMap.append((pattern if sep else '*', ref_file))
+            for filename in profilerAnalysis.findProfilerFiles(args.paths):
+                ref_file = profilerAnalysis.matchReference(filename,
+                                                           referenceMap)
+                try:
+                    if ref_file is None:
+                        raise ValueError('No reference matches this file')
+                    store.analyze(filename, ref_file, args.particle,
+                                  args.mode, args.gamma, machine=args.machine,
+                                  energy=args.energy)
+                except Exception as error:
+                    sys.stderr.write('%s: %s: %s\n' % (filename,
+                                     type(error).__name__, error))
+        else:
+            [dates, values] = store.trend(args.key, args.machine, args.energy,
+                                          args.start, args.stop)
+            writer = csv.writer(sys.stdout)
+            writer.writerow(['date', args.key])
+            for [date, value] in zip(dates, values):
+                writer.writerow([str(date), '' if value != value else value])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+###############################################################################
+# Tests of the dropped counts rejection of arc analyses.
+#
+# acceptedFrameMask and ArcAccumulator.update are checked against the
+# frame by frame loop of the original analyzeArc, which skipped frames by
+# advancing its frame iterator with next(frameNum_iter), on random error
+# sequences fed in blocks of random sizes:
+#
+#   python -m unittest test_profilerAnalysis
+###############################################################################
+import unittest
+import numpy
+
+import profilerAnalysis
+
+#The original loop: returns the accepted frame numbers and the number of
+#frames that triggered a skip. Errors are indexed by frame number - 1.
+def referenceArcLoop(averageABErrors, averageGTErrors, threshold,
+                     numFrames2skip, startFrame):
+    numFrames = len(averageABErrors)
+    acceptedFrames = []
+    numSkippedFrames = 0
+
+    frameNum = range(startFrame,numFrames+1)
+    frameNum_iter = iter(frameNum)
+    for frame in frameNum_iter:
+        if ((averageABErrors[frame-1] > threshold) |
+            (averageGTErrors[frame-1] > threshold)):
+            numSkippedFrames += 1
+            for i in range(0,numFrames2skip):
+                next(frameNum_iter,None) #skipping happens in this for loop
+        else:
+            acceptedFrames.append(frame)
+    return acceptedFrames, numSkippedFrames
+
+#Random errors, a fraction 'rate' of them over the threshold (3)
+def randomErrors(random, numFrames, rate):
+    errors = random.uniform(0, 3, numFrames)
+    errors[random.rand(numFrames) < rate] += 2
+    return numpy.round(errors, 1) #ties on the threshold too
+
+#Random block lengths adding up to numFrames
+def randomBlocks(random, numFrames):
+    blocks = []
+    while sum(blocks) < numFrames:
+        blocks.append(min(random.choice([1, 2, 3, 7, 50, numFrames]),
+                          numFrames - sum(blocks)))
+    return blocks
+
+class AcceptedFrameMaskTest(unittest.TestCase):
+    def test_random_sequences(self):
+        random = numpy.random.RandomState(0)
+        for trial in range(500):
+            numFrames = random.randint(0, 200)
+            numFrames2skip = random.randint(0, 8)
+            exceeds = random.rand(numFrames) < random.uniform(0, 0.5)
+            [expected, expectedSkipped] = referenceArcLoop(
+                exceeds*10.0, numpy.zeros(numFrames), 3, numFrames2skip, 1)
+
+            #blocks carry the frames left to skip over to the next one
+            masks = []
+            numSkippedFrames = 0
+            framesLeft2skip = 0
+            start = 0
+            for length in randomBlocks(random, numFrames):
+                [mask, numTriggers, framesLeft2skip] = (
+                    profilerAnalysis.acceptedFrameMask(
+                    exceeds[start:start+length], numFrames2skip,
+                    framesLeft2skip))
+                masks.append(mask)
+                numSkippedFrames += numTriggers
+                start += length
+            mask = numpy.concatenate(masks + [numpy.zeros(0, dtype=bool)])
+
+            self.assertEqual(list(numpy.flatnonzero(mask) + 1), expected)
+            self.assertEqual(numSkippedFrames, expectedSkipped)
+
+    def test_every_short_sequence(self):
+        for numFrames2skip in range(4):
+            for numFrames in range(10):
+                for bits in range(2**numFrames):
+                    exceeds = numpy.array([(bits >> i) & 1
+                                           for i in range(numFrames)], bool)
+                    [expected, expectedSkipped] = referenceArcLoop(
+                        exceeds*10.0, numpy.zeros(numFrames), 3,
+                        numFrames2skip, 1)
+                    [mask, numTriggers, framesLeft2skip] = (
+                        profilerAnalysis.acceptedFrameMask(exceeds,
+                                                           numFrames2skip))
+                    self.assertEqual(list(numpy.flatnonzero(mask) + 1),
+                                     expected)
+                    self.assertEqual(numTriggers, expectedSkipped)
+
+class ArcAccumulatorUpdateTest(unittest.TestCase):
+    def test_random_sequences(self):
+        random = numpy.random.RandomState(1)
+        for trial in range(500):
+            numFrames = random.randint(0, 200)
+            config = profilerAnalysis.PHOTON.replace(
+                numFrames2skip=random.randint(0, 8),
+                startFrame=random.randint(1, 30))
+            rate = random.uniform(0, 0.3)
+            averageABErrors = randomErrors(random, numFrames, rate)
+            averageGTErrors = randomErrors(random, numFrames, rate)
+            [expected, expectedSkipped] = referenceArcLoop(
+                averageABErrors, averageGTErrors, config.threshold,
+                config.numFrames2skip, config.startFrame)
+
+            accumulator = profilerAnalysis.ArcAccumulator(config)
+            frameNums = numpy.arange(1, numFrames+1)
+            start = 0
+            for length in randomBlocks(random, numFrames):
+                block = slice(start, start+length)
+                accumulator.update(frameNums[block], averageABErrors[block],
+                                   averageGTErrors[block],
+                                   2*averageABErrors[block],
+                                   2*averageGTErrors[block])
+                start += length
+
+            frames = accumulator.frameResults()
+            self.assertEqual(list(frames[:,0]), expected)
+            self.assertEqual(accumulator.numSkippedFrames, expectedSkipped)
+            self.assertEqual(accumulator.count, len(expected))
+            accepted = numpy.array(expected, dtype=int) - 1
+            self.assertAlmostEqual(accumulator.avgABsum,
+                                   averageABErrors[accepted].sum())
+            self.assertAlmostEqual(accumulator.avgGTsum,
+                                   averageGTErrors[accepted].sum())
+            #first frame with the highest error, as the loop found it
+            #(frame 0 while no error is above 0)
+            for [errors, frameAvg_max] in (
+                (averageABErrors, accumulator.frameABavg_max),
+                (averageGTErrors, accumulator.frameGTavg_max)):
+                if expected and errors[accepted].max() > 0:
+                    self.assertEqual(frameAvg_max,
+                                     expected[numpy.argmax(errors[accepted])])
+                else:
+                    self.assertEqual(frameAvg_max, 0)
+
+if __name__ == '__main__':
+    unittest.main()